@@ -0,0 +1,89 @@
+""" Round trips and latency of task + reminder creation versus batch size
+
+Runs against the database configured in .env:
+
+	python benchmarks/bench_bulk_insert.py [batch sizes...]
+
+"row-by-row" replays the previous path (add_all, one refresh per task,
+one commit per reminder), "bulk" is general_service.create_tasks +
+create_remiders inside a single transaction.
+"""
+import asyncio
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from sqlalchemy import event, delete
+""" Internal imports """
+from core.db import engine, get_session, init_database_and_tables
+from services import general_service as gen
+from models.db_models import ProjectBase, ReminderBase, Reminders, TaskBase, Tasks, UserBase
+
+
+round_trips = { 'n': 0 }
+
+@event.listens_for(engine.sync_engine, 'before_cursor_execute')
+def _count_statement(*args) -> None:
+	round_trips['n'] += 1
+
+@event.listens_for(engine.sync_engine, 'commit')
+def _count_commit(*args) -> None:
+	round_trips['n'] += 1
+
+
+async def row_by_row(project_id: int, batch: list) -> None:
+	async with get_session() as s:
+		tasks = [ Tasks(**task.model_dump()) for task in batch ]
+		s.add_all(tasks)
+		await s.commit()
+		for task in tasks:
+			await s.refresh(task)
+		for task in tasks:
+			s.add(Reminders(title=task.title, project_id=project_id, task_id=task.id))
+			await s.commit()
+
+async def bulk(project_id: int, batch: list) -> None:
+	async with get_session() as s:
+		ids = await gen.create_tasks(s, batch)
+		await gen.create_remiders(s, [
+			ReminderBase(title=task.title, project_id=project_id, task_id=id)
+			for task, id in zip(batch, ids)
+		])
+		await s.commit()
+
+async def cleanup(project_id: int) -> None:
+	async with get_session() as s:
+		await s.exec(delete(Reminders).where(Reminders.project_id == project_id))
+		await s.exec(delete(Tasks).where(Tasks.project_id == project_id))
+		await s.commit()
+
+async def main(sizes: list) -> None:
+	await init_database_and_tables()
+	async with get_session() as s:
+		owner_id = await gen.create_user(s, UserBase(name='bench'))
+		project_id = await gen.create_project(s, ProjectBase(title='bench', owner_id=owner_id))
+		await s.commit()
+
+	print(f"{'batch':>6} {'path':>11} {'round trips':>12} {'ms':>9}")
+	for size in sizes:
+		batch = [ TaskBase(title=f'task_{i}', description='bench', project_id=project_id) for i in range(size) ]
+		for name, path in (('row-by-row', row_by_row), ('bulk', bulk)):
+			round_trips['n'] = 0
+			start = perf_counter()
+			await path(project_id, batch)
+			elapsed = (perf_counter() - start) * 1000
+			print(f"{size:>6} {name:>11} {round_trips['n']:>12} {elapsed:>9.1f}")
+			await cleanup(project_id)
+
+	async with get_session() as s:
+		await gen.delete_project_by_id(s, project_id)
+		await gen.delete_user_by_id(s, owner_id)
+		await s.commit()
+	await engine.dispose()
+
+
+if __name__ == '__main__':
+	sizes = [ int(arg) for arg in sys.argv[1:] ] or [ 1, 10, 50, 200, 1000 ]
+	asyncio.run(main(sizes))
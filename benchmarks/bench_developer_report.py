@@ -0,0 +1,85 @@
+""" Developer report: previous multi-query path versus the single-pass report
+
+Runs against the database configured in .env:
+
+	python benchmarks/bench_developer_report.py [tasks per developer]
+
+Seeds one developer with N tasks (default 10 000) in mixed states, then times
+both paths and counts the statements each one sends.
+"""
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from sqlalchemy import event, delete
+""" Internal imports """
+from core.db import engine, get_session, init_database_and_tables
+from services import general_service as gen
+from services import report_service as rep
+from models.db_models import ProjectBase, TaskBase, TaskStatus, Tasks, UserBase
+
+
+statements = { 'n': 0 }
+
+@event.listens_for(engine.sync_engine, 'before_cursor_execute')
+def _count_statement(*args) -> None:
+	statements['n'] += 1
+
+
+async def previous_report(s, user_id: int, project_id: int) -> None:
+	""" The shape of get_developer_report before the single-pass rewrite """
+	tasks = await rep.get_completed_tasks_by_user_id(s, user_id, project_id)
+	await rep.get_overdue_tasks_by_user_id(s, user_id, project_id)
+	await rep.get_all_tasks_by_user_id(s, user_id, project_id)
+	await rep.get_tasks_in_progress_by_user_id(s, user_id, project_id)
+	await rep.get_todo_tasks_by_user_id(s, user_id, project_id)
+	await rep.get_user_name_by_user_id(s, user_id)
+	await rep.get_most_time_duration_task(tasks)
+	await rep.get_least_time_duration_task(tasks)
+	for task in await rep.get_all_tasks_by_user_id(s, user_id, project_id):
+		await rep.calculate_task_duration(task)
+		await rep.get_task_allotted_time(task)
+
+async def single_pass_report(s, user_id: int, project_id: int) -> None:
+	await rep.get_developer_report(s, user_id, project_id)
+
+async def main(size: int) -> None:
+	await init_database_and_tables()
+	async with get_session() as s:
+		user_id = await gen.create_user(s, UserBase(name='bench'))
+		project_id = await gen.create_project(s, ProjectBase(title='bench', owner_id=user_id))
+		now = datetime.now(timezone.utc).replace(tzinfo=None)
+		statuses = list(TaskStatus)
+		await gen.create_tasks(s, [
+			TaskBase(
+				title=f'task_{i}', project_id=project_id, user_id=user_id,
+				status=statuses[i % len(statuses)],
+				deadline=now + timedelta(days=(i % 7) - 3)
+			) for i in range(size)
+		])
+		await s.commit()
+
+	print(f"{'path':>12} {'statements':>11} {'ms':>9}")
+	for name, path in (('previous', previous_report), ('single-pass', single_pass_report)):
+		async with get_session() as s:
+			statements['n'] = 0
+			start = perf_counter()
+			await path(s, user_id, project_id)
+			elapsed = (perf_counter() - start) * 1000
+		print(f"{name:>12} {statements['n']:>11} {elapsed:>9.1f}")
+
+	async with get_session() as s:
+		await s.exec(delete(Tasks).where(Tasks.project_id == project_id))
+		await gen.delete_project_by_id(s, project_id)
+		await gen.delete_user_by_id(s, user_id)
+		await s.commit()
+	await engine.dispose()
+
+
+if __name__ == '__main__':
+	size = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+	asyncio.run(main(size))
@@ -0,0 +1,76 @@
+""" Upstream latency per LLM provider through the shared queue, retry and streaming path
+
+Needs no database. Runs against the providers configured in .env:
+
+	python benchmarks/bench_llm_providers.py [requests] [provider ...]
+
+Sends N requests (default 50) to each provider (default: stub), one at a time
+and then all at once, and prints latency percentiles and time to first chunk.
+Pass URL= and MODEL= in the environment for providers that take them from
+the request, e.g. yandex or openai without OPENAI_URL.
+"""
+import asyncio
+import os
+import sys
+from statistics import mean, quantiles
+from time import perf_counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+""" Internal imports """
+from core.http import create_http_client
+from services import llm_service
+from services.llm_providers import close_providers, get_provider
+
+
+URL = os.getenv('URL', '')
+MODEL = os.getenv('MODEL', '')
+TOKEN = os.getenv('IAM_TOKEN', '')
+
+
+def _request(stream: bool = False) -> dict:
+	return {
+		'modelUri': MODEL,
+		'completionOptions': { 'stream': stream, 'temperature': 0.1, 'max_tokens': 64 },
+		'messages': [ { 'role': 'user', 'text': 'Reply with one short sentence.' } ],
+	}
+
+async def _complete(client, provider) -> float:
+	start = perf_counter()
+	await llm_service.complete(client, provider, URL, _request(), llm_service.build_headers(TOKEN), timeout=60)
+	return perf_counter() - start
+
+async def _first_chunk(client, provider) -> float:
+	""" Time until the first streamed chunk arrives """
+	client = provider.client(client)
+	start = perf_counter()
+	upstream = provider.build(client, URL, _request(stream=True), llm_service.build_headers(TOKEN), 60)
+	response = await client.send(upstream, stream=True)
+	try:
+		async for line in response.aiter_lines():
+			if provider.chunk(line) is not None:
+				return perf_counter() - start
+	finally:
+		await response.aclose()
+	return perf_counter() - start
+
+def _row(name: str, mode: str, seconds: list) -> None:
+	p50, p95 = (quantiles(seconds, n=20)[i] for i in (9, 18)) if len(seconds) > 1 else (seconds[0], seconds[0])
+	print(f"{name:>8} {mode:>12} {mean(seconds) * 1000:>9.1f} {p50 * 1000:>9.1f} {p95 * 1000:>9.1f}")
+
+async def main(size: int, names: list) -> None:
+	client = create_http_client()
+	print(f"{'provider':>8} {'mode':>12} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+	for name in names:
+		provider = get_provider(name)
+		_row(name, 'sequential', [ await _complete(client, provider) for _ in range(size) ])
+		_row(name, 'concurrent', await asyncio.gather(*(_complete(client, provider) for _ in range(size))))
+		_row(name, 'first chunk', [ await _first_chunk(client, provider) for _ in range(min(size, 10)) ])
+	await close_providers()
+	await client.aclose()
+
+
+if __name__ == '__main__':
+	size = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+	names = sys.argv[2:] or ['stub']
+	asyncio.run(main(size, names))
@@ -2,7 +2,9 @@
 from fastapi import APIRouter
 """ Internal imports """
 from api import database
+from api import events
 from api import llm
+from api import metrics
 
 
 db_router = APIRouter(prefix="/db", tags=["/db"])
@@ -11,7 +13,15 @@ db_router.include_router(database.router)
 llm_router = APIRouter(prefix="/llm", tags=["/llm"])
 llm_router.include_router(llm.router)
 
+metrics_router = APIRouter(prefix="/metrics", tags=["/metrics"])
+metrics_router.include_router(metrics.router)
+
+events_router = APIRouter(prefix="/events", tags=["/events"])
+events_router.include_router(events.router)
+
 """ APIRouter added to upper router(src/main.py) """
 router = APIRouter(prefix="/api", tags=["/api"])
 router.include_router(db_router)
-router.include_router(llm_router)
\ No newline at end of file
+router.include_router(llm_router)
+router.include_router(metrics_router)
+router.include_router(events_router)
\ No newline at end of file
@@ -8,6 +8,8 @@ from .teams import teams_router
 from .reports import reports_router
 from .reminders import reminders_router
 from .plans import plans_router
+from .context import context_router
+from .prompts import prompts_router
 
 """ APIRouter added to upper router(api/__init__.py) """
 router = APIRouter()
@@ -18,4 +20,6 @@ router.include_router(tasks_router)
 router.include_router(teams_router)
 router.include_router(reports_router)
 router.include_router(reminders_router)
-router.include_router(plans_router)
\ No newline at end of file
+router.include_router(plans_router)
+router.include_router(context_router)
+router.include_router(prompts_router)
\ No newline at end of file
@@ -0,0 +1,2 @@
+""" Internal imports """
+from .routes import router as context_router
@@ -0,0 +1,14 @@
+""" FastAPI imports """
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+""" Internal imports """
+from services import general_service as gen
+
+
+""" APIRouter added to upper router(db/__init__.py) """
+router = APIRouter(prefix="/context", tags=["/context"])
+
+@router.get("/project/{id}/export")
+async def export_context_by_project_id(id: int):
+	""" Streams every context message of a project as NDJSON, one object per line """
+	return StreamingResponse(gen.export_context_by_project_id(id), media_type='application/x-ndjson')
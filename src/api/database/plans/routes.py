@@ -8,7 +8,7 @@ from sqlalchemy.exc import SQLAlchemyError
 """ typing imports """
 from typing import Any, Dict, List, Optional, Union
 """ Internal imports """
-from core.db import SessionDep, get_db
+from core.db import SessionDep
 from services import general_service as gen
 from models.db_models import Plans
 
@@ -16,10 +16,10 @@ from models.db_models import Plans
 """ APIRouter added to upper router(db/__init__.py) """
 router = APIRouter(prefix="/plans", tags=["/plans"])
 
-@router.get('/project/{project_id}', dependencies=[Depends(get_db)])
+@router.get('/project/{project_id}')
 async def get_last_project_by_id(s: SessionDep, project_id: int) -> Optional[Plans]:
 	q = select(Plans).where(Plans.project_id == project_id).order_by(desc(Plans.created_at)).limit(1)
-	plan = s.exec(q).first()
+	plan = (await s.exec(q)).first()
 	return plan if plan else None
 
 	
\ No newline at end of file
@@ -0,0 +1,2 @@
+""" Internal imports """
+from .routes import router as prompts_router
\ No newline at end of file
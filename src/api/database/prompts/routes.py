@@ -0,0 +1,38 @@
+""" FastAPI imports """
+from fastapi import APIRouter, Body, HTTPException
+""" SQLAlchemy imports """
+from sqlalchemy.exc import SQLAlchemyError
+""" typing imports """
+from typing import Dict
+""" Internal imports """
+from core.db import SessionDep
+from services import prompt_service as prompts
+from models.db_models import PromptTitle
+
+
+""" APIRouter added to upper router(db/__init__.py) """
+router = APIRouter(prefix="/prompts", tags=["/prompts"])
+
+@router.get("/", response_model=Dict[PromptTitle, str])
+async def get_prompts():
+	""" Prompts as currently cached by this worker """
+	return prompts.get_prompts()
+
+@router.put("/{title}", response_model=Dict[PromptTitle, str])
+async def upsert_prompt(s: SessionDep, title: PromptTitle, prompt: str = Body(..., embed=True)):
+	""" Stores a prompt, every worker reloads its cache once the change is committed """
+	try:
+		await prompts.upsert_prompt(s, title, prompt)
+		await s.commit()
+		return await prompts.load(s)
+	except SQLAlchemyError as e:
+		await s.rollback()
+		raise HTTPException(status_code=500, detail=f"Error updating prompt {title}: {str(e)}")
+
+@router.post("/reload", response_model=Dict[PromptTitle, str])
+async def reload_prompts(s: SessionDep):
+	""" Rereads prompts into this worker's cache after the table was edited directly """
+	try:
+		return await prompts.load(s)
+	except SQLAlchemyError as e:
+		raise HTTPException(status_code=500, detail=f"Error reloading prompts: {str(e)}")
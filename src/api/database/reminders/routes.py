@@ -4,10 +4,13 @@ from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request
 from sqlmodel import select
 """ SQLAlchemy imports """
 from sqlalchemy.exc import SQLAlchemyError
+""" collections imports """
+from collections import deque
 """ typing imports """
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Deque, Dict, List, Optional, Union
 """ Internal imports """
-from core.db import SessionDep, get_db
+from core.db import SessionDep
+from core.config import PAGE_SIZE, MAX_PAGE_SIZE
 from services import general_service as gen
 from models.db_models import ReminderBase, ReminderUpdate, Reminders
 
@@ -15,17 +18,17 @@ from models.db_models import ReminderBase, ReminderUpdate, Reminders
 """ APIRouter added to upper router(db/__init__.py) """
 router = APIRouter(prefix="/reminders", tags=["/reminders"])
 
-@router.get("/", dependencies=[Depends(get_db)], response_model=List[Reminders])
-async def get_all_reminders(s: SessionDep):
+@router.get("/", response_model=List[Reminders])
+async def get_all_reminders(s: SessionDep, after_id: Optional[int] = Query(None), limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
     try:
-        reminders = await gen.get_all_reminders(s)
+        reminders = await gen.get_all_reminders(s, after_id, limit)
         if reminders is None:
             raise HTTPException(status_code=404, detail="Error getting reminders")
         return reminders
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"Error getting remiders: {str(e)}")
 
-@router.get("/bat/", dependencies=[Depends(get_db)], response_model=List[Reminders])
+@router.get("/bat/", response_model=List[Reminders])
 async def get_reminders_by_project_ids(s: SessionDep, project_ids: List[int] = Query(...)):
     try:
         reminders = await gen.get_reminders_by_project_ids(s, project_ids)
@@ -35,9 +38,23 @@ async def get_reminders_by_project_ids(s: SessionDep, project_ids: List[int] = Q
     except SQLAlchemyError as e:
         raise HTTPException(status_code=500, detail=f"Error getting reminders by IDs: {str(e)}")
 
-@router.delete("/{task_id}", dependencies=[Depends(get_db)], response_model=int)
+@router.delete("/{task_id}", response_model=int)
 async def delete_reminder_by_task_id(s: SessionDep, task_id: int):
     try:
         return await gen.delete_reminder_by_task_id(s, task_id)
     except SQLAlchemyError as e:
 	    raise HTTPException(status_code=500, detail=f"Error deleting task by id {id}: {str(e)}")
+
+
+""" Local stand-in for a webhook receiver: point REMINDER_WEBHOOK_URL here in tests """
+_webhook_stub: Deque[Dict] = deque(maxlen=100)
+
+@router.post("/webhook/stub")
+async def receive_reminder(reminder: Dict = Body(...)):
+    _webhook_stub.append(reminder)
+    return { 'received': len(_webhook_stub) }
+
+@router.get("/webhook/stub", response_model=List[Dict])
+async def get_received_reminders():
+    """ Last reminders delivered to the stub, oldest first """
+    return list(_webhook_stub)
@@ -7,7 +7,7 @@ from sqlalchemy.exc import SQLAlchemyError
 """ typing imports """
 from typing import Any, Dict, List, Optional, Union
 """ Internal imports """
-from core.db import SessionDep, get_db
+from core.db import SessionDep
 from services import report_service as rep
 from models.db_models import TeamBase, TeamUpdate, Teams,Tasks
 
@@ -1,5 +1,6 @@
 """ FastAPI imports """
 from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 """ SQLModel imports"""
 from sqlmodel import select
 """ SQLAlchemy imports """
@@ -8,37 +9,66 @@ from sqlalchemy.exc import SQLAlchemyError
 """ typing imports """
 from typing import Any, Dict, List, Optional, Union
 """ Internal imports """
-from core.db import SessionDep, get_db
+from core.db import SessionDep
+from core.config import PAGE_SIZE, MAX_PAGE_SIZE
 from services import general_service as gen
-from models.db_models import TaskBase, TaskUpdate, Tasks, ReminderBase, ReminderUpdate, Reminders
+from services import reminder_service
+from models.db_models import TaskBase, TaskPriority, TaskStatus, TaskUpdate, Tasks, ReminderBase, ReminderUpdate, Reminders
 
-from datetime import datetime, timedelta
+from datetime import datetime
 
 
 """ APIRouter added to upper router(db/__init__.py) """
 router = APIRouter(prefix="/tasks", tags=["/tasks"])
 
-@router.get("/", dependencies=[Depends(get_db)], response_model=List[Tasks])
-async def get_all_tasks(s: SessionDep):
+@router.get("/", response_model=List[Tasks])
+async def get_all_tasks(
+	s: SessionDep,
+	after_id: Optional[int] = Query(None), limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+	status: Optional[TaskStatus] = Query(None),
+	priority: Optional[TaskPriority] = Query(None),
+	user_id: Optional[int] = Query(None),
+	deadline_from: Optional[datetime] = Query(None),
+	deadline_to: Optional[datetime] = Query(None)
+):
 	try:
-		tasks = await gen.get_all_tasks(s)
+		tasks = await gen.get_all_tasks(
+			s, after_id, limit,
+			status=status, priority=priority, user_id=user_id,
+			deadline_from=deadline_from, deadline_to=deadline_to)
 		if tasks is None:
 			raise HTTPException(status_code=404, detail="Error getting tasks")
 		return tasks
 	except SQLAlchemyError as e:
 		raise HTTPException(status_code=500, detail=f"Error getting tasks: {str(e)}")
 
-@router.get("/project/{id}", dependencies=[Depends(get_db)], response_model=List[Tasks])
-async def get_all_tasks_by_project_id(s: SessionDep, id: int):
+@router.get("/project/{id}", response_model=List[Tasks])
+async def get_all_tasks_by_project_id(
+	s: SessionDep, id: int,
+	after_id: Optional[int] = Query(None), limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+	status: Optional[TaskStatus] = Query(None),
+	priority: Optional[TaskPriority] = Query(None),
+	user_id: Optional[int] = Query(None),
+	deadline_from: Optional[datetime] = Query(None),
+	deadline_to: Optional[datetime] = Query(None)
+):
 	try:
-		tasks = await gen.get_all_task_by_project_id(s, id)
+		tasks = await gen.get_all_task_by_project_id(
+			s, id, after_id, limit,
+			status=status, priority=priority, user_id=user_id,
+			deadline_from=deadline_from, deadline_to=deadline_to)
 		if tasks is None:
 			raise HTTPException(status_code=404, detail=f"Error getting tasks by project_id {id}")
 		return tasks
 	except SQLAlchemyError as e:
 		raise HTTPException(status_code=500, detail=f"Erorr getting tasks by project_id {id}: {str(e)}")
 
-@router.get("/{id}", dependencies=[Depends(get_db)], response_model=Tasks)
+@router.get("/project/{id}/export")
+async def export_tasks_by_project_id(id: int):
+	""" Streams every task of a project as NDJSON, one object per line """
+	return StreamingResponse(gen.export_tasks_by_project_id(id), media_type='application/x-ndjson')
+
+@router.get("/{id}", response_model=Tasks)
 async def get_task_by_id(s: SessionDep, id: int):
 	try:
 		task = await gen.get_task_by_id(s, id)
@@ -48,12 +78,12 @@ async def get_task_by_id(s: SessionDep, id: int):
 	except SQLAlchemyError as e:
 		raise HTTPException(status_code=500, detail=f"Erorr getting tasks by project_id {id}: {str(e)}")
 
-@router.post("/", dependencies=[Depends(get_db)], response_model=int)
+@router.post("/", response_model=int)
 async def create_task(s: SessionDep, task: TaskBase):
 	try:
 		id_task = await gen.create_task(s, task)
 		if task.deadline:
-			remind = ReminderBase(title = task.title, send_time=datetime.now() + timedelta(hours=(task.deadline - datetime.now()).total_seconds() / 3600 - 24), user_id=task.user_id, project_id=task.project_id, task_id=id_task)
+			remind = ReminderBase(title = task.title, send_time=reminder_service.send_time_for(task.deadline), user_id=task.user_id, project_id=task.project_id, task_id=id_task)
 		else:
 			remind = ReminderBase(title = task.title,  user_id=task.user_id, project_id=task.project_id, task_id=id_task)
 		await gen.create_remider(s, remind)
@@ -61,38 +91,36 @@ async def create_task(s: SessionDep, task: TaskBase):
 	except SQLAlchemyError as e:
 		raise HTTPException(status_code=500, detail=f"Error creating task: {str(e)}")
 
-@router.post("/bat/", dependencies=[Depends(get_db)], response_model=List[int])
+@router.post("/bat/", response_model=List[int])
 async def create_tasks(s: SessionDep, tasks: List[TaskBase]):
 	try:
 		ids = await gen.create_tasks(s, tasks)
 		if ids is None:
 			raise HTTPException(status_code=404, detail="Error creation tasks")
-		i = 0
-		for task in tasks:
-			id = ids[i]
-			await gen.create_remider(s, ReminderBase(
+		await gen.create_remiders(s, [
+			ReminderBase(
 				title=task.title, user_id=task.user_id,
 				project_id=task.project_id, task_id=id
-			))
-			i += 1
+			) for task, id in zip(tasks, ids)
+		])
 		return ids
 
 	except SQLAlchemyError as e:
 		raise HTTPException(status_code=500, detail=f"Error creating tasks: {str(e)}")
 
-@router.put("/{id}", dependencies=[Depends(get_db)], response_model=int)
+@router.put("/{id}", response_model=int)
 async def update_task_by_id(s: SessionDep, id: int, upd: TaskUpdate):
 	try:
 		upd_remind = None
 		if upd.deadline:
-			delta = timedelta(hours=(upd.deadline - datetime.now()).total_seconds() / 3600 - 24)
+			send_time = reminder_service.send_time_for(upd.deadline)
 			if upd.title:
-				upd_remind = ReminderUpdate(title=upd.title, send_time=datetime.now() + delta, user_id=upd.user_id)
+				upd_remind = ReminderUpdate(title=upd.title, send_time=send_time, user_id=upd.user_id)
 				print("\n\nupd_remd\n")
 				print(upd_remind)
 				print("\n\n")
 			else:
-				upd_remind = ReminderUpdate(send_time=datetime.now() + delta, user_id=upd.user_id)
+				upd_remind = ReminderUpdate(send_time=send_time, user_id=upd.user_id)
 				print("\n\nupd_remd\n")
 				print(upd_remind)
 				print("\n\n")
@@ -102,7 +130,7 @@ async def update_task_by_id(s: SessionDep, id: int, upd: TaskUpdate):
 	except SQLAlchemyError as e:
 		raise HTTPException(status_code=500, detail=f"Error updating task by id {id}: {str(e)}")
 
-@router.delete("/{id}", dependencies=[Depends(get_db)], response_model=int)
+@router.delete("/{id}", response_model=int)
 async def delete_task_by_id(s: SessionDep, id: int):
 	try:
 		if await gen.exist_reminder_by_task_id(s, id):
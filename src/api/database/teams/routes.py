@@ -3,11 +3,12 @@ from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request
 """ SQLModel imports"""
 from sqlmodel import col, select
 """ SQLAlchemy imports """
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 """ typing imports """
 from typing import Any, Dict, List, Optional, Union
 """ Internal imports """
-from core.db import SessionDep, get_db
+from core.db import SessionDep
+from core.config import PAGE_SIZE, MAX_PAGE_SIZE
 from services import general_service as gen
 from models.db_models import Errors, TeamBase, TeamUpdate, Teams, Users
 
@@ -15,17 +16,17 @@ from models.db_models import Errors, TeamBase, TeamUpdate, Teams, Users
 """ APIRouter added to upper router(db/__init__.py) """
 router = APIRouter(prefix="/teams", tags=["/teams"])
 
-@router.get("/", dependencies=[Depends(get_db)], response_model=List[Teams])
-async def get_all_teams(s: SessionDep):
+@router.get("/", response_model=List[Teams])
+async def get_all_teams(s: SessionDep, after_id: Optional[int] = Query(None), limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
 	try:
-		teams = await gen.get_all_teams(s)
+		teams = await gen.get_all_teams(s, after_id, limit)
 		if teams is None:
 			raise HTTPException(status_code=404, detail="Error getting teams")
 		return teams
 	except SQLAlchemyError as e:
 		raise HTTPException(status_code=500, detail=f"Error getting teams: {str(e)}")
 
-@router.get("/project/{id}", dependencies=[Depends(get_db)], response_model=List[Teams])
+@router.get("/project/{id}", response_model=List[Teams])
 async def get_team_by_project_id(s: SessionDep, id: int):
 	try:
 		teams = await gen.get_team_by_project_id(s, id)
@@ -35,14 +36,14 @@ async def get_team_by_project_id(s: SessionDep, id: int):
 	except SQLAlchemyError as e:
 		raise HTTPException(status_code=500, detail=f"Error getting team by project_id {id}: {str(e)}")
 
-@router.get("/is/admin/{user_id}/project/{project_id}", dependencies=[Depends(get_db)], response_model=bool)
+@router.get("/is/admin/{user_id}/project/{project_id}", response_model=bool)
 async def is_admin(s: SessionDep, user_id: int, project_id: int):
 	try:
 		return await gen.is_admin(s, user_id, project_id)
 	except SQLAlchemyError as e:
 		raise HTTPException(status_code=500, detail=f"Error getting team by project_id {id}: {str(e)}")
 
-@router.get("/{id}", dependencies=[Depends(get_db)], response_model=Teams)
+@router.get("/{id}", response_model=Teams)
 async def get_team_by_id(s: SessionDep, id: int):
 	try:
 		team = await gen.get_team_by_id(s, id)
@@ -51,26 +52,34 @@ async def get_team_by_id(s: SessionDep, id: int):
 	except SQLAlchemyError as e:
 		raise HTTPException(status_code=500, detail=f"Error getting team by id {id}: {str(e)}")
 
-@router.post("/owner/{owner_id}/project/{project_id}", dependencies=[Depends(get_db)], response_model=int)
+@router.post("/owner/{owner_id}/project/{project_id}", response_model=int)
 async def create_team(s: SessionDep, owner_id: int, project_id: int):
 	try:
 		team = TeamBase(user_id=owner_id, project_id=project_id)
 		return await gen.create_team(s, team)
+	except IntegrityError as e:
+		if gen.is_unique_violation(e):
+			raise HTTPException(status_code=409, detail=f"User {owner_id} is already in the team of project {project_id}")
+		raise HTTPException(status_code=500, detail=f"Error creating team: {str(e)}")
 	except SQLAlchemyError as e:
 		raise HTTPException(status_code=500, detail=f"Error creating team: {str(e)}")
 
-@router.post("/user/{user_id}/project/{project_id}", dependencies=[Depends(get_db)], response_model=Union[int, str])
+@router.post("/user/{user_id}/project/{project_id}", response_model=Union[int, str])
 async def add_user_to_team(s: SessionDep, user_id: int, project_id: int):
 	try:
-		if not gen.is_present_by_id(s, Users, user_id):
+		if not await gen.is_present_by_id(s, Users, user_id):
 			return Errors.DOES_NOT_EXIST
  
 		team = TeamBase(user_id=user_id, project_id=project_id)
 		return await gen.add_user_to_team(s, team)
+	except IntegrityError as e:
+		if gen.is_unique_violation(e):
+			raise HTTPException(status_code=409, detail=f"User {user_id} is already in the team of project {project_id}")
+		raise HTTPException(status_code=500, detail=f"Error creating teams: {str(e)}")
 	except SQLAlchemyError as e:
 		raise HTTPException(status_code=500, detail=f"Error creating teams: {str(e)}")
 
-@router.put("/user/{user_id}/project/{project_id}", dependencies=[Depends(get_db)], response_model=int)
+@router.put("/user/{user_id}/project/{project_id}", response_model=int)
 async def update_team_by_user_id_and_project_id(
   s: SessionDep, user_id: int, project_id: int, upd: TeamUpdate
   ):
@@ -79,14 +88,14 @@ async def update_team_by_user_id_and_project_id(
 	except SQLAlchemyError as e:
 		raise HTTPException(status_code=500, detail=f"Error updating team by user_id {id}: {str(e)}")
 
-@router.put("/{id}", dependencies=[Depends(get_db)], response_model=int)
+@router.put("/{id}", response_model=int)
 async def update_team_by_id(s: SessionDep, id: int, upd: TeamUpdate):
 	try:
 		return await gen.update_team_by_(s=s, team_id=id, upd=upd)
 	except SQLAlchemyError as e:
 		raise HTTPException(status_code=500, detail=f"Error updating team by team_id {id}: {str(e)}")
 
-@router.delete("/user/{user_id}/project/{project_id}", dependencies=[Depends(get_db)], response_model=int)
+@router.delete("/user/{user_id}/project/{project_id}", response_model=int)
 async def delete_team_by_user_id_and_project_id(
   s: SessionDep, user_id: int, project_id: int
   ):
@@ -94,7 +103,7 @@ async def delete_team_by_user_id_and_project_id(
 	except SQLAlchemyError as e:
 		raise HTTPException(status_code=500, detail=f"Error deleting team by user_id {user_id} and project_id {project_id}: {str(e)}")
 
-@router.delete("/{id}", dependencies=[Depends(get_db)], response_model=int)
+@router.delete("/{id}", response_model=int)
 async def delete_team_by_id(s: SessionDep, id: int):
 	try:
 		return await gen.delete_team_by_(s, team_id=id)
@@ -9,7 +9,8 @@ from sqlalchemy.exc import SQLAlchemyError
 """ typing imports """
 from typing import Any, List, Optional, Union
 """ Internal imports """
-from core.db import SessionDep, get_db
+from core.db import SessionDep
+from core.config import PAGE_SIZE, MAX_PAGE_SIZE
 from services import general_service as gen
 from models.db_models import UserBase, Users
 
@@ -17,17 +18,17 @@ from models.db_models import UserBase, Users
 """ APIRouter added to upper router(db/__init__.py) """
 router = APIRouter(prefix="/users", tags=["/users"])
 
-@router.get("/", dependencies=[Depends(get_db)], response_model=List[Users])
-async def get_all_users(s: SessionDep):
+@router.get("/", response_model=List[Users])
+async def get_all_users(s: SessionDep, after_id: Optional[int] = Query(None), limit: int = Query(PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE)):
 	try:
-		users = await gen.get_all_users(s)
+		users = await gen.get_all_users(s, after_id, limit)
 		if users is None:
 			raise HTTPException(status_code=404, detail="Error getting users")
 		return users	
 	except SQLAlchemyError as e:
 		raise HTTPException(status_code=500, detail=f"Error getting users: {str(e)}")
 
-@router.get("/{id}", dependencies=[Depends(get_db)], response_model=Optional[Users])
+@router.get("/{id}", response_model=Optional[Users])
 async def get_user_by_id(s: SessionDep, id: int):
 	try:
 		user =  await gen.get_user_by_id(s, id)
@@ -37,7 +38,7 @@ async def get_user_by_id(s: SessionDep, id: int):
 	except SQLAlchemyError as e:
 		raise HTTPException(status_code=500, detail=f"Error getting user by id {id}: {str(e)}")
 
-@router.get("/bat/", dependencies=[Depends(get_db)], response_model=List[Users])
+@router.get("/bat/", response_model=List[Users])
 async def get_users_by_ids(s: SessionDep, id: List[int] = Query(...)):
 	try:
 		users = await gen.get_users_by_ids(s, id)
@@ -47,15 +48,15 @@ async def get_users_by_ids(s: SessionDep, id: List[int] = Query(...)):
 	except SQLAlchemyError as e:
 		raise HTTPException(status_code=500, detail=f"Error getting users by IDs: {str(e)}")
 
-@router.post("/", dependencies=[Depends(get_db)], response_model=int)
+@router.post("/", response_model=int)
 async def create_user(s: SessionDep, user: UserBase): 
 	try:
 		return await gen.create_user(s, user)
 	except SQLAlchemyError as e:
-		s.rollback()
+		await s.rollback()
 		raise HTTPException(status_code=500, detail=f"Error creating user: {str(e)}")
 
-@router.post("/bat", dependencies=[Depends(get_db)], response_model=List[int])
+@router.post("/bat", response_model=List[int])
 async def create_users(s: SessionDep, users: List[UserBase]):
 	try:
 		ids = await gen.create_users(s, users)
@@ -63,13 +64,13 @@ async def create_users(s: SessionDep, users: List[UserBase]):
 			raise HTTPException(status_code=404, detail="Error creating users")
 		return ids
 	except SQLAlchemyError as e:
-		s.rollback()
+		await s.rollback()
 		raise HTTPException(status_code=500, detail=f"Error creating users: {str(e)}")
 
-@router.delete("/{id}", dependencies=[Depends(get_db)], response_model=int)
+@router.delete("/{id}", response_model=int)
 async def delete_user_by_id(s: SessionDep, id: int):
 	try:
 		return await gen.delete_user_by_id(s, id)
 	except SQLAlchemyError as e:
-		s.rollback()
+		await s.rollback()
 		raise HTTPException(status_code=500, detail=f"Error deleting user by id {id}: {str(e)}")
@@ -0,0 +1,44 @@
+""" FastAPI imports """
+from fastapi import APIRouter, Query, Request
+from fastapi.responses import StreamingResponse
+""" asyncio imports """
+import asyncio
+""" json imports """
+import json
+""" typing imports """
+from typing import AsyncIterator, List
+""" Internal imports """
+from core.events import Subscription, bus
+
+
+""" Seconds between comment lines that keep idle connections and proxies alive """
+HEARTBEAT_INTERVAL = 15
+
+""" APIRouter added to upper router(api/__init__.py) """
+router = APIRouter()
+
+async def _stream(request: Request, subscription: Subscription) -> AsyncIterator[str]:
+	try:
+		yield ': connected\n\n'
+		while not await request.is_disconnected():
+			if subscription.lagged:
+				""" Events were dropped, the client should refetch what it shows """
+				subscription.lagged = False
+				yield 'event: lagged\ndata: {}\n\n'
+			try:
+				event = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_INTERVAL)
+			except asyncio.TimeoutError:
+				yield ': ping\n\n'
+				continue
+			yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+	finally:
+		bus.unsubscribe(subscription)
+
+@router.get("/")
+async def stream_events(request: Request, project_ids: List[int] = Query(...)) -> StreamingResponse:
+	""" Server-sent events of the projects given: task.created, task.updated, task.deleted and reminder.fired """
+	subscription = bus.subscribe(project_ids)
+	return StreamingResponse(
+		_stream(request, subscription), status_code=200, media_type='text/event-stream',
+		headers={ 'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no' }
+	)
@@ -1,16 +1,22 @@
 """ FastAPI imports """
 import traceback
-from fastapi import APIRouter, Body, Depends, Query, Request
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request
 from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 """ httpx import """
 import httpx
+""" SQLAlchemy imports """
+from sqlalchemy.exc import SQLAlchemyError
 """ typing imports """
 from typing import Optional, Union
 """ Internal imports """
-from services import llm_service
+from services import job_service, llm_service
+from services.llm_providers import get_provider
 from models.llm_models import BaseRequest, CompletionOptions, Message, OptionsRequest, ProblemRequest
-from models.db_models import PromptTitle
-from core.db import SessionDep, get_db
+from models.db_models import LlmJobRead, LlmJobs, PromptTitle
+from core.db import SessionDep
+from core.http import HttpClientDep
+from core.limiter import QueueTimeout
 
 
 """ APIRouter added to general  """
@@ -18,6 +24,7 @@ router = APIRouter(prefix="/ygpt")
 
 @router.get("/")
 async def send_api_request_to_llm(
+  client: HttpClientDep,
   url_path: str,
   json: Optional[dict] = None,
   stream: Optional[bool] = False,
@@ -29,75 +36,116 @@ async def send_api_request_to_llm(
   if stream:
     """ Get json stream response """
     async def _iterate_over_JSONs():
-      async with httpx.AsyncClient() as client:
-        async with client.stream('POST', url=url_path, json=json, timeout=timeout) as response:
-          async for chunk in response.aiter_text():
-            yield chunk
+      async with client.stream('POST', url=url_path, json=json, timeout=timeout) as response:
+        async for chunk in response.aiter_text():
+          yield chunk
     return StreamingResponse(_iterate_over_JSONs(), status_code=200, media_type='application/json')
 
   else:
     """ Get only one json response """
-    async with httpx.AsyncClient() as client:
-      response = await client.post(url=url_path, json=json, timeout=timeout)
-      result = response.json()
-      return result
+    response = await client.post(url=url_path, json=json, timeout=timeout)
+    result = response.json()
+    return result
 
-@router.post("/", dependencies=[Depends(get_db)])
+@router.post("/")
 async def send_request(
 	s: SessionDep,
+	client: HttpClientDep,
 	url: str = Query(...),
 	action: PromptTitle = Query(...),
 	project_id: int = Query(...),
 	context_depth: int = Query(...),
 	timeout: int = Query(...),
+	provider: Optional[str] = Query(None),
 	json: BaseRequest | ProblemRequest | OptionsRequest = Body(...)
 ) -> JSONResponse:
-	""" Sends request to ygpt """
+	""" Sends request to ygpt, or to the provider given or routed for the action """
 
-	""" Building a request """
-	request = {
-		'modelUri': json.model_uri,
-		'completionOptions': CompletionOptions().model_dump()
-	}
-
-	if isinstance(json, OptionsRequest):
-		request['completionOptions'] = json.options
-		request['jsonSchema'] = { "schema": {
-			"tasks": [
-				{"1": "description"},
-				{"2": "description"},
-				{"3": "description"},
-				{"4": "description"},
-				{"5": "description"},
-			]}
-		}
-		
-	if action in [PromptTitle.TASK, PromptTitle.DIV_TASK, PromptTitle.RE_TASK]:
-		request['jsonObject'] = True
-
-
-	headers = {
-		'Authorization': 'Bearer ' + json.iam_token,
-		'Content-Type' : 'application/json'
-	}
-
-	if isinstance(json, ProblemRequest):
-		request.update({
-			'problem': json.problem
-		})
+	try:
+		backend = get_provider(provider, action)
+	except KeyError:
+		raise HTTPException(status_code=400, detail=f"Unknown provider {provider}")
+	request = llm_service.build_request(json, action)
+	headers = llm_service.build_headers(json.iam_token)
 
 	try:
+		if request['completionOptions']['stream']:
+			""" Relay chunks as they arrive, store the answer when the stream is over """
+			stream = await llm_service.stream_request(
+				s=s, client=client, url=url,
+				request=request,
+				headers=headers,
+				action=action,
+				project_id=project_id,
+				context_depth=context_depth,
+				timeout=timeout,
+				provider=backend
+			)
+			return StreamingResponse(
+				stream.events(), status_code=200, media_type='text/event-stream',
+				headers={ 'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no' },
+				background=BackgroundTask(stream.save)
+			)
+
 		response =  await llm_service.general_request(
-			s=s, url=url,
+			s=s, client=client, url=url,
 			request=request,
 			headers=headers,
 			action=action,
 			project_id=project_id,
 			context_depth=context_depth,
-			timeout=timeout
+			timeout=timeout,
+			provider=backend
 		)
 		return response
+	except QueueTimeout:
+		return JSONResponse(content={ 'error' : 'Too many upstream requests in flight, try again later' }, status_code=503)
+	except httpx.HTTPStatusError as e:
+		""" Upstream refused even after retries """
+		status = 503 if e.response.status_code == 429 else 502
+		return JSONResponse(content={ 'error' : f'{str(e)}', 'upstream_status': e.response.status_code }, status_code=status)
+	except httpx.TimeoutException as e:
+		return JSONResponse(content={ 'error' : f'Upstream timed out: {str(e)}' }, status_code=504)
+	except httpx.TransportError as e:
+		return JSONResponse(content={ 'error' : f'{str(e)}' }, status_code=502)
 	except Exception as e:
 		traceback_details = traceback.format_exc()
 		print(traceback_details)
-		return JSONResponse(content={ 'error' : f'{str(e)}'}, status_code=404)
+		return JSONResponse(content={ 'error' : f'{str(e)}'}, status_code=500)
+
+
+@router.post("/jobs", status_code=202)
+async def submit_job(
+	s: SessionDep,
+	url: str = Query(...),
+	action: PromptTitle = Query(...),
+	project_id: int = Query(...),
+	context_depth: int = Query(...),
+	timeout: int = Query(...),
+	provider: Optional[str] = Query(None),
+	json: BaseRequest | ProblemRequest | OptionsRequest = Body(...)
+) -> dict:
+	""" Queues the request for a background worker, poll GET /jobs/{id} for the result """
+	try:
+		get_provider(provider, action)
+	except KeyError:
+		raise HTTPException(status_code=400, detail=f"Unknown provider {provider}")
+	request = llm_service.build_request(json, action)
+	request['completionOptions']['stream'] = False
+	try:
+		id = await job_service.submit(s, LlmJobs(
+			project_id=project_id, action=action, url=url, provider=provider,
+			context_depth=context_depth, timeout=timeout,
+			request=request, iam_token=json.iam_token
+		))
+		return { 'id': id }
+	except SQLAlchemyError as e:
+		await s.rollback()
+		raise HTTPException(status_code=500, detail=f"Error submitting job: {str(e)}")
+
+@router.get("/jobs/{id}", response_model=LlmJobRead)
+async def get_job(s: SessionDep, id: int):
+	job = await job_service.get_job_by_id(s, id)
+	if job is None:
+		raise HTTPException(status_code=404, detail=f"Error getting job by id {id}")
+	return job
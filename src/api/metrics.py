@@ -0,0 +1,15 @@
+""" FastAPI imports """
+from fastapi import APIRouter
+""" typing imports """
+from typing import Dict
+""" Internal imports """
+from core.metrics import metrics
+
+
+""" APIRouter added to upper router(api/__init__.py) """
+router = APIRouter()
+
+@router.get("/", response_model=Dict)
+async def get_metrics():
+	""" Returns process-local counters, timings and gauges """
+	return metrics.snapshot()
@@ -0,0 +1,126 @@
+""" abc imports """
+from abc import ABC, abstractmethod
+""" asyncio imports """
+import asyncio
+""" collections imports """
+from collections import OrderedDict
+""" typing imports """
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, Optional, Tuple, TypeVar
+""" time imports """
+from time import monotonic
+
+
+T = TypeVar('T')
+
+
+class TTLCache:
+	""" Process-local mapping whose entries expire after ttl seconds,
+	evicting the least recently used one past maxsize. maxsize 0 disables it """
+
+	def __init__(self, maxsize: int, ttl: float) -> None:
+		self.maxsize = maxsize
+		self.ttl = ttl
+		self._data: OrderedDict[Hashable, Tuple[float, Any]] = OrderedDict()
+
+	def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+		item = self._data.get(key)
+		if item is None:
+			return default
+		expires, value = item
+		if expires < monotonic():
+			del self._data[key]
+			return default
+		self._data.move_to_end(key)
+		return value
+
+	def set(self, key: Hashable, value: Any) -> None:
+		if self.maxsize <= 0:
+			return
+		self._data[key] = (monotonic() + self.ttl, value)
+		self._data.move_to_end(key)
+		while len(self._data) > self.maxsize:
+			self._data.popitem(last=False)
+
+	def pop(self, key: Hashable) -> None:
+		self._data.pop(key, None)
+
+	def clear(self) -> None:
+		self._data.clear()
+
+	def __len__(self) -> int:
+		return len(self._data)
+
+
+class CacheBackend(ABC):
+	""" Async key-value store behind read-through caches. Keys are strings and values
+	plain data (dicts, lists, scalars), so a shared store such as Redis can stand in """
+
+	@abstractmethod
+	async def get(self, key: str) -> Optional[Any]: ...
+
+	@abstractmethod
+	async def set(self, key: str, value: Any) -> None: ...
+
+	@abstractmethod
+	async def delete(self, keys: Iterable[str]) -> None: ...
+
+	@abstractmethod
+	async def clear(self) -> None: ...
+
+class LocalCacheBackend(CacheBackend):
+	""" TTLCache of this process """
+
+	def __init__(self, maxsize: int, ttl: float) -> None:
+		self._cache = TTLCache(maxsize, ttl)
+
+	async def get(self, key: str) -> Optional[Any]:
+		return self._cache.get(key)
+
+	async def set(self, key: str, value: Any) -> None:
+		self._cache.set(key, value)
+
+	async def delete(self, keys: Iterable[str]) -> None:
+		for key in keys:
+			self._cache.pop(key)
+
+	async def clear(self) -> None:
+		self._cache.clear()
+
+	def __len__(self) -> int:
+		return len(self._cache)
+
+
+class _Call:
+	def __init__(self, task: asyncio.Task) -> None:
+		self.task = task
+		self.waiters = 0
+
+
+class SingleFlight:
+	""" Collapses concurrent calls with the same key into one, every caller gets its result.
+	The call runs as its own task: a caller leaving does not cancel it for the others,
+	it is cancelled only once nobody waits for it any more """
+
+	def __init__(self) -> None:
+		self._calls: Dict[Hashable, _Call] = {}
+
+	async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+		""" Returns the result and whether it was shared from a call already in flight """
+		call = self._calls.get(key)
+		shared = call is not None
+		if call is None:
+			call = self._calls[key] = _Call(asyncio.ensure_future(fn()))
+			call.task.add_done_callback(lambda task: self._done(key, call))
+		call.waiters += 1
+		try:
+			return await asyncio.shield(call.task), shared
+		finally:
+			call.waiters -= 1
+			if not call.waiters and not call.task.done():
+				call.task.cancel()
+
+	def _done(self, key: Hashable, call: _Call) -> None:
+		if self._calls.get(key) is call:
+			del self._calls[key]
+		""" Marks the outcome retrieved even when nobody was left to wait for it """
+		call.task.cancelled() or call.task.exception()
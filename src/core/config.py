@@ -8,4 +8,88 @@ SERVER = os.getenv('POSTGRES_SERVER')
 PORT = os.getenv('POSTGRES_PORT')
 DB = os.getenv('POSTGRES_DB')
 USER = os.getenv('POSTGRES_USER')
-PASSWORD = os.getenv('POSTGRES_PASSWORD')
\ No newline at end of file
+PASSWORD = os.getenv('POSTGRES_PASSWORD')
+
+""" Engine and connection pool settings """
+def _as_bool(value: str) -> bool:
+	return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+DB_ECHO = _as_bool(os.getenv('POSTGRES_ECHO', 'false'))
+DB_POOL_SIZE = int(os.getenv('POSTGRES_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('POSTGRES_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('POSTGRES_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(os.getenv('POSTGRES_POOL_RECYCLE', '1800'))
+DB_POOL_PRE_PING = _as_bool(os.getenv('POSTGRES_POOL_PRE_PING', 'true'))
+""" Milliseconds, 0 disables the server side limit """
+DB_STATEMENT_TIMEOUT = int(os.getenv('POSTGRES_STATEMENT_TIMEOUT', '0'))
+
+""" Background jobs, seconds """
+STATS_RECONCILE_INTERVAL = float(os.getenv('STATS_RECONCILE_INTERVAL', '60'))
+CONTEXT_COMPACT_INTERVAL = float(os.getenv('CONTEXT_COMPACT_INTERVAL', '600'))
+REMINDER_POLL_INTERVAL = float(os.getenv('REMINDER_POLL_INTERVAL', '30'))
+
+""" List endpoints """
+PAGE_SIZE = int(os.getenv('PAGE_SIZE', '100'))
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', '1000'))
+""" Rows fetched per server-side cursor round trip in NDJSON exports """
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '500'))
+
+""" Read-through cache of users, projects and teams, per worker. Writes through
+the service helpers invalidate it in every worker once committed """
+ENTITY_CACHE_SIZE = int(os.getenv('ENTITY_CACHE_SIZE', '10000'))
+ENTITY_CACHE_TTL = float(os.getenv('ENTITY_CACHE_TTL', '60'))
+
+""" Upstream LLM HTTP client """
+LLM_HTTP2 = _as_bool(os.getenv('LLM_HTTP2', 'true'))
+LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', '100'))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('LLM_MAX_KEEPALIVE_CONNECTIONS', '20'))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv('LLM_KEEPALIVE_EXPIRY', '60'))
+LLM_CONNECT_TIMEOUT = float(os.getenv('LLM_CONNECT_TIMEOUT', '10'))
+""" Concurrent upstream calls per model URI and token, and seconds a call may wait for a slot """
+LLM_CONCURRENCY = int(os.getenv('LLM_CONCURRENCY', '8'))
+LLM_QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', '60'))
+""" Retries on 429, 5xx and transport errors, exponential backoff with full jitter in seconds """
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '3'))
+LLM_RETRY_BACKOFF = float(os.getenv('LLM_RETRY_BACKOFF', '0.5'))
+LLM_RETRY_BACKOFF_MAX = float(os.getenv('LLM_RETRY_BACKOFF_MAX', '30'))
+""" Background LLM jobs: workers per process (0 leaves them to other processes),
+idle poll interval, seconds a claimed job is leased, and runs before a job is given up """
+LLM_JOB_WORKERS = int(os.getenv('LLM_JOB_WORKERS', '4'))
+LLM_JOB_POLL_INTERVAL = float(os.getenv('LLM_JOB_POLL_INTERVAL', '5'))
+LLM_JOB_LEASE = float(os.getenv('LLM_JOB_LEASE', '600'))
+LLM_JOB_MAX_ATTEMPTS = int(os.getenv('LLM_JOB_MAX_ATTEMPTS', '3'))
+
+""" LLM backends: yandex, ollama, openai (any OpenAI-compatible server) or stub.
+LLM_ACTION_PROVIDERS routes actions elsewhere, e.g. "div_task=ollama,re_plan=ollama" """
+LLM_DEFAULT_PROVIDER = os.getenv('LLM_DEFAULT_PROVIDER', 'yandex')
+LLM_ACTION_PROVIDERS = {
+	action.strip(): provider.strip()
+	for action, _, provider in (route.partition('=') for route in os.getenv('LLM_ACTION_PROVIDERS', '').split(','))
+	if provider.strip()
+}
+OLLAMA_URL = os.getenv('OLLAMA_URL', 'http://localhost:11434')
+OLLAMA_MODEL = os.getenv('OLLAMA_MODEL')
+""" Unset, the url and model_uri of each request are used """
+OPENAI_URL = os.getenv('OPENAI_URL')
+OPENAI_MODEL = os.getenv('OPENAI_MODEL')
+""" Seconds the stub provider takes to answer """
+LLM_STUB_LATENCY = float(os.getenv('LLM_STUB_LATENCY', '0.05'))
+""" Identical upstream requests are answered from memory for LLM_CACHE_TTL seconds, 0 entries disables it """
+LLM_CACHE_SIZE = int(os.getenv('LLM_CACHE_SIZE', '256'))
+LLM_CACHE_TTL = float(os.getenv('LLM_CACHE_TTL', '3600'))
+
+""" LLM context window, token counts are estimated from message length """
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '4000'))
+CONTEXT_CHARS_PER_TOKEN = 4
+""" Context compaction: turns of a project's action beyond CONTEXT_COMPACT_AFTER
+are folded into one summary, keeping the newest CONTEXT_KEEP_TURNS as they are """
+CONTEXT_COMPACT_AFTER = int(os.getenv('CONTEXT_COMPACT_AFTER', '100'))
+CONTEXT_KEEP_TURNS = int(os.getenv('CONTEXT_KEEP_TURNS', '40'))
+CONTEXT_SUMMARY_CHARS = int(os.getenv('CONTEXT_SUMMARY_CHARS', '4000'))
+
+""" Reminder delivery: comma separated sinks (log, webhook), reminders claimed per poll,
+and sends before a failing reminder is given up """
+REMINDER_SINKS = [ sink.strip() for sink in os.getenv('REMINDER_SINKS', 'log').split(',') if sink.strip() ]
+REMINDER_WEBHOOK_URL = os.getenv('REMINDER_WEBHOOK_URL')
+REMINDER_BATCH_SIZE = int(os.getenv('REMINDER_BATCH_SIZE', '500'))
+REMINDER_MAX_ATTEMPTS = int(os.getenv('REMINDER_MAX_ATTEMPTS', '3'))
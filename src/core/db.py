@@ -1,26 +1,124 @@
 """ SQLModel imports """
 from fastapi import Depends
-from sqlmodel import Session, create_engine, SQLModel
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+""" SQLAlchemy imports """
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+""" psycopg imports """
+import psycopg
 """ typing imports """
-from typing import Annotated, Optional
+from typing import Annotated, Awaitable, Callable, Optional
 """ ABC imports """
-from collections.abc import Generator
+from collections.abc import AsyncGenerator, AsyncIterator
+""" time imports """
+from time import perf_counter
 """ Internal imports """
 from models.db_models import *
-from .config import SERVER, PORT, PASSWORD, DB, USER
+from .config import (
+  SERVER, PORT, PASSWORD, DB, USER,
+  DB_ECHO, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT,
+  DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_STATEMENT_TIMEOUT
+)
+from .metrics import metrics
 
 
-database_url = f"postgresql+psycopg2://{USER}:{PASSWORD}@{SERVER}:{PORT}/{DB}"
+conninfo = f"postgresql://{USER}:{PASSWORD}@{SERVER}:{PORT}/{DB}"
+database_url = conninfo.replace('postgresql://', 'postgresql+psycopg://', 1)
 
-engine = create_engine(database_url, echo=True)
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+  """ Queue pool that records how long each checkout waited for a connection """
+  def _do_get(self):
+    start = perf_counter()
+    try:
+      return super()._do_get()
+    except PoolTimeoutError:
+      metrics.inc('db.pool.checkout_timeouts')
+      raise
+    finally:
+      metrics.observe('db.pool.checkout_wait_seconds', perf_counter() - start)
+
+
+connect_args = { }
+if DB_STATEMENT_TIMEOUT > 0:
+  connect_args['options'] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT}"
+
+engine = create_async_engine(
+  database_url,
+  echo=DB_ECHO,
+  poolclass=TimedQueuePool,
+  pool_size=DB_POOL_SIZE,
+  max_overflow=DB_MAX_OVERFLOW,
+  pool_timeout=DB_POOL_TIMEOUT,
+  pool_recycle=DB_POOL_RECYCLE,
+  pool_pre_ping=DB_POOL_PRE_PING,
+  connect_args=connect_args
+)
+
+""" Pool gauges """
+def _pool_saturation() -> float:
+  pool = engine.pool
+  capacity = pool.size() + max(DB_MAX_OVERFLOW, 0)
+  return pool.checkedout() / capacity if capacity else 0.0
+
+metrics.gauge('db.pool.size', lambda: engine.pool.size())
+metrics.gauge('db.pool.checked_out', lambda: engine.pool.checkedout())
+metrics.gauge('db.pool.checked_in', lambda: engine.pool.checkedin())
+metrics.gauge('db.pool.overflow', lambda: engine.pool.overflow())
+metrics.gauge('db.pool.saturation', _pool_saturation)
+
+
+def _dedupe_teams(conn) -> None:
+  """ Duplicate memberships would fail the unique index, the oldest row is kept """
+  teams, duplicate = Teams.__table__, Teams.__table__.alias()
+  conn.execute(teams.delete()
+    .where(teams.c.user_id == duplicate.c.user_id, teams.c.project_id == duplicate.c.project_id, teams.c.id > duplicate.c.id))
+
+def _add_missing_columns(conn) -> None:
+  """ create_all skips new columns of tables that already exist """
+  conn.execute(text("ALTER TABLE llmjobs ADD COLUMN IF NOT EXISTS provider VARCHAR"))
+
+def _create_missing_indexes(conn) -> None:
+  """ create_all skips the indexes of tables that already exist """
+  for table in SQLModel.metadata.sorted_tables:
+    for index in table.indexes:
+      index.create(conn, checkfirst=True)
 
 async def init_database_and_tables() -> None:
-  #SQLModel.metadata.drop_all(engine)
-  SQLModel.metadata.create_all(engine)
+  async with engine.begin() as conn:
+    #await conn.run_sync(SQLModel.metadata.drop_all)
+    await conn.run_sync(SQLModel.metadata.create_all)
+    await conn.run_sync(_add_missing_columns)
+    await conn.run_sync(_dedupe_teams)
+    await conn.run_sync(_create_missing_indexes)
+
+
+def get_session() -> AsyncSession:
+  """ Session outside of request scope (background jobs, streaming) """
+  return AsyncSession(engine, expire_on_commit=False)
+
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
+  """ One session per request, committed once as a unit of work """
+  async with get_session() as session:
+    try:
+      yield session
+      await session.commit()
+    except Exception:
+      await session.rollback()
+      raise
 
+SessionDep = Annotated[ AsyncSession, Depends(get_db) ]
 
-def get_db() -> Generator[Session, None, None]:
-  with Session(engine) as session:
-    yield session
 
-SessionDep = Annotated[ Session, Depends(get_db) ]
+async def listen(channel: str, on_listen: Optional[Callable[[], Awaitable[None]]] = None) -> AsyncIterator[str]:
+  """ Yields NOTIFY payloads of a channel, over a dedicated connection kept out of the pool.
+  on_listen runs once LISTEN is active, so nothing committed after it can be missed """
+  async with await psycopg.AsyncConnection.connect(conninfo, autocommit=True) as conn:
+    await conn.execute(f'LISTEN "{channel}"')
+    if on_listen:
+      await on_listen()
+    async for notify in conn.notifies():
+      yield notify.payload
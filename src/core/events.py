@@ -0,0 +1,115 @@
+""" SQLAlchemy imports """
+from sqlalchemy import Text, bindparam, func, select
+from sqlalchemy.dialects.postgresql import ARRAY
+""" asyncio imports """
+import asyncio
+import traceback
+""" json imports """
+import json
+""" typing imports """
+from typing import Awaitable, Callable, Dict, Iterable, List, Set
+""" Internal imports """
+from .db import SessionDep, listen
+from .metrics import metrics
+
+
+""" Every worker listens on this channel and fans events out to its own subscribers """
+EVENTS_CHANNEL = 'thready_events'
+LISTEN_RETRY_DELAY = 5
+""" Events buffered per subscriber, a slower client loses the overflow and is told so """
+SUBSCRIBER_BUFFER = 256
+
+
+class Subscription:
+	""" Events of some projects, queued for one client """
+
+	def __init__(self, project_ids: Iterable[int]) -> None:
+		self.project_ids: Set[int] = set(project_ids)
+		self.queue: asyncio.Queue = asyncio.Queue(SUBSCRIBER_BUFFER)
+		self.lagged = False
+
+
+class EventBus:
+	""" In-process fan-out of events by project. Events enter through the database
+	(see publish), so every worker sees them once their transaction commits """
+
+	def __init__(self) -> None:
+		self._subscribers: Dict[int, Set[Subscription]] = {}
+		self._handlers: List[Callable[[Dict], None]] = []
+		self._resyncs: List[Callable[[], Awaitable[None]]] = []
+
+	def subscribe(self, project_ids: Iterable[int]) -> Subscription:
+		subscription = Subscription(project_ids)
+		for project_id in subscription.project_ids:
+			self._subscribers.setdefault(project_id, set()).add(subscription)
+		return subscription
+
+	def unsubscribe(self, subscription: Subscription) -> None:
+		for project_id in subscription.project_ids:
+			subscribers = self._subscribers.get(project_id)
+			if subscribers is not None:
+				subscribers.discard(subscription)
+				if not subscribers:
+					del self._subscribers[project_id]
+
+	def add_handler(self, handler: Callable[[Dict], None]) -> None:
+		""" Called with every event, whatever its project """
+		self._handlers.append(handler)
+
+	def add_resync(self, resync: Callable[[], Awaitable[None]]) -> None:
+		""" Called whenever listening (re)starts, as events sent meanwhile are lost """
+		self._resyncs.append(resync)
+
+	async def resync(self) -> None:
+		for resync in self._resyncs:
+			await resync()
+
+	def dispatch(self, event: Dict) -> None:
+		metrics.inc('events.received')
+		for handler in self._handlers:
+			try:
+				handler(event)
+			except Exception:
+				traceback.print_exc()
+		if event.get('internal'):
+			return
+		for subscription in self._subscribers.get(event.get('project_id'), ()):
+			try:
+				subscription.queue.put_nowait(event)
+			except asyncio.QueueFull:
+				subscription.lagged = True
+				metrics.inc('events.dropped')
+
+	@property
+	def subscriptions(self) -> int:
+		return len({ subscription for subscribers in self._subscribers.values() for subscription in subscribers })
+
+
+bus = EventBus()
+metrics.gauge('events.subscriptions', lambda: bus.subscriptions)
+
+
+async def publish(s: SessionDep, events: List[Dict], internal: bool = False) -> None:
+	""" Queues events in the current transaction, in one round trip however many there are.
+	NOTIFY is transactional: nothing is seen before commit, and nothing after a rollback.
+	Internal events only reach the handlers of each worker, never its subscribers """
+	if not events:
+		return
+	if internal:
+		events = [ { **event, 'internal': True } for event in events ]
+	payload = func.unnest(bindparam('payloads', [ json.dumps(event, default=str) for event in events ], type_=ARRAY(Text))).column_valued('payload')
+	await s.exec(select(func.pg_notify(EVENTS_CHANNEL, payload)))
+
+
+async def run_listener() -> None:
+	""" Background job: feeds the bus from the events channel """
+	while True:
+		try:
+			async for payload in listen(EVENTS_CHANNEL, on_listen=bus.resync):
+				bus.dispatch(json.loads(payload))
+		except asyncio.CancelledError:
+			raise
+		except Exception:
+			metrics.inc('events.listener_errors')
+			traceback.print_exc()
+		await asyncio.sleep(LISTEN_RETRY_DELAY)
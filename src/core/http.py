@@ -0,0 +1,31 @@
+""" FastAPI imports """
+from fastapi import Depends, Request
+""" httpx imports """
+import httpx
+""" typing imports """
+from typing import Annotated
+""" Internal imports """
+from .config import (
+  LLM_HTTP2, LLM_MAX_CONNECTIONS, LLM_MAX_KEEPALIVE_CONNECTIONS,
+  LLM_KEEPALIVE_EXPIRY, LLM_CONNECT_TIMEOUT
+)
+
+
+def create_http_client() -> httpx.AsyncClient:
+  """ Application-lifetime client shared by all upstream LLM traffic,
+  keeps TLS sessions and keep-alive connections warm between calls """
+  return httpx.AsyncClient(
+    http2=LLM_HTTP2,
+    limits=httpx.Limits(
+      max_connections=LLM_MAX_CONNECTIONS,
+      max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+      keepalive_expiry=LLM_KEEPALIVE_EXPIRY
+    ),
+    timeout=httpx.Timeout(30, connect=LLM_CONNECT_TIMEOUT)
+  )
+
+
+def get_http_client(request: Request) -> httpx.AsyncClient:
+  return request.app.state.http_client
+
+HttpClientDep = Annotated[ httpx.AsyncClient, Depends(get_http_client) ]
@@ -0,0 +1,77 @@
+""" asyncio imports """
+import asyncio
+from contextlib import asynccontextmanager
+""" heapq imports """
+from heapq import heapify, heappop, heappush
+""" enum imports """
+from enum import IntEnum
+""" itertools imports """
+from itertools import count
+""" typing imports """
+from typing import AsyncIterator, List, Optional, Tuple
+
+
+class Priority(IntEnum):
+	""" Lower values are admitted first """
+	INTERACTIVE = 0
+	BATCH = 1
+
+
+class QueueTimeout(Exception):
+	""" No slot became free within the queue timeout """
+
+
+class PriorityLimiter:
+	""" Admits at most limit holders at once, waiters go in by priority, then arrival """
+
+	def __init__(self, limit: int) -> None:
+		self.limit = limit
+		self.active = 0
+		self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+		self._arrivals = count()
+
+	@property
+	def waiting(self) -> int:
+		return len(self._waiters)
+
+	@property
+	def idle(self) -> bool:
+		return not self.active and not self._waiters
+
+	async def acquire(self, priority: Priority = Priority.INTERACTIVE, timeout: Optional[float] = None) -> None:
+		if self.active < self.limit and not self._waiters:
+			self.active += 1
+			return
+
+		granted = asyncio.get_running_loop().create_future()
+		entry = (int(priority), next(self._arrivals), granted)
+		heappush(self._waiters, entry)
+		try:
+			await asyncio.wait_for(granted, timeout)
+		except BaseException as e:
+			if granted.done() and not granted.cancelled():
+				""" The slot was handed over just as the wait ended """
+				self.release()
+			elif entry in self._waiters:
+				self._waiters.remove(entry)
+				heapify(self._waiters)
+			if isinstance(e, asyncio.TimeoutError):
+				raise QueueTimeout() from e
+			raise
+
+	def release(self) -> None:
+		""" Hands the slot straight to the next waiter, if any """
+		while self._waiters:
+			_, _, granted = heappop(self._waiters)
+			if not granted.done():
+				granted.set_result(None)
+				return
+		self.active -= 1
+
+	@asynccontextmanager
+	async def slot(self, priority: Priority = Priority.INTERACTIVE, timeout: Optional[float] = None) -> AsyncIterator[None]:
+		await self.acquire(priority, timeout)
+		try:
+			yield
+		finally:
+			self.release()
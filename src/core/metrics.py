@@ -0,0 +1,51 @@
+""" threading imports """
+from threading import Lock
+""" typing imports """
+from typing import Callable, Dict, Union
+
+
+Number = Union[int, float]
+
+
+class Metrics:
+	""" Process-local counters, timings and gauges exported by /api/metrics """
+
+	def __init__(self) -> None:
+		self._lock = Lock()
+		self._counters: Dict[str, Number] = {}
+		self._timings: Dict[str, Dict[str, Number]] = {}
+		self._gauges: Dict[str, Callable[[], Number]] = {}
+
+	def inc(self, name: str, value: Number = 1) -> None:
+		with self._lock:
+			self._counters[name] = self._counters.get(name, 0) + value
+
+	def observe(self, name: str, value: Number) -> None:
+		""" Keeps count, sum and max of an observed value (usually seconds) """
+		with self._lock:
+			timing = self._timings.setdefault(name, {'count': 0, 'sum': 0.0, 'max': 0.0})
+			timing['count'] += 1
+			timing['sum'] += value
+			if value > timing['max']:
+				timing['max'] = value
+
+	def counter(self, name: str) -> Number:
+		with self._lock:
+			return self._counters.get(name, 0)
+
+	def gauge(self, name: str, fn: Callable[[], Number]) -> None:
+		""" Registers a value computed at export time """
+		self._gauges[name] = fn
+
+	def snapshot(self) -> Dict:
+		with self._lock:
+			counters = dict(self._counters)
+			timings = {
+				name: {**timing, 'avg': timing['sum'] / timing['count'] if timing['count'] else 0.0}
+				for name, timing in self._timings.items()
+			}
+		gauges = { name: fn() for name, fn in self._gauges.items() }
+		return { 'counters': counters, 'timings': timings, 'gauges': gauges }
+
+
+metrics = Metrics()
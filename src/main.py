@@ -6,16 +6,51 @@ from services.general_service import create_project
 from models.db_models import ProjectBase
 """ asyncio imports """
 import asyncio
+from contextlib import asynccontextmanager
 """ uvicorn imports """
 import uvicorn
 import uvicorn.config
 """ Internal imports """
 import api
-from core.db import init_database_and_tables
+from core import events
+from core.db import get_session, init_database_and_tables
+from core.http import create_http_client
+from core.config import CONTEXT_COMPACT_INTERVAL, LLM_JOB_WORKERS, REMINDER_POLL_INTERVAL, STATS_RECONCILE_INTERVAL
+from services.llm_providers import close_providers
+from services import context_service, job_service, membership_service, prompt_service, reminder_service, stats_service
+
+
+""" Background jobs live as long as the application """
+@asynccontextmanager
+async def lifespan(app: fa.FastAPI):
+	app.state.http_client = create_http_client()
+	async with get_session() as s:
+		await prompt_service.load(s)
+		await membership_service.load(s)
+	jobs = [
+		asyncio.create_task(stats_service.run_reconciliation(STATS_RECONCILE_INTERVAL)),
+		asyncio.create_task(prompt_service.run_listener()),
+		asyncio.create_task(context_service.run_compaction(CONTEXT_COMPACT_INTERVAL)),
+		asyncio.create_task(job_service.run_listener()),
+		asyncio.create_task(events.run_listener()),
+	]
+	jobs.extend(
+		asyncio.create_task(job_service.run_worker(app.state.http_client))
+		for _ in range(LLM_JOB_WORKERS)
+	)
+	jobs.append(asyncio.create_task(reminder_service.run_scheduler(
+		reminder_service.build_sinks(app.state.http_client), REMINDER_POLL_INTERVAL
+	)))
+	yield
+	for job in jobs:
+		job.cancel()
+	await asyncio.gather(*jobs, return_exceptions=True)
+	await close_providers()
+	await app.state.http_client.aclose()
 
 
 """ Application starts here """
-server: fa.FastAPI = fa.FastAPI()
+server: fa.FastAPI = fa.FastAPI(lifespan=lifespan)
 
 server.include_router(router=api.router)
 
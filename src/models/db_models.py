@@ -1,5 +1,5 @@
 """ SQLModel imports """
-from sqlalchemy import JSON, BigInteger, Column, ForeignKey
+from sqlalchemy import JSON, BigInteger, Column, ForeignKey, Index
 from sqlmodel import Field, Relationship, SQLModel
 """ typing imports """
 from typing import Optional, List
@@ -90,6 +90,16 @@ class Tasks(TaskBase, table=True):
 	user: "Users" = Relationship(back_populates="tasks", sa_relationship_kwargs={"lazy": "joined"})
 	project: "Projects" = Relationship(back_populates="tasks", sa_relationship_kwargs={"lazy": "joined"})
 
+""" Keyset pages of a project's tasks """
+Index('ix_tasks_project_id_id', Tasks.project_id, Tasks.id)
+
+""" Open tasks by deadline, serves overdue lookups """
+Index(
+	'ix_tasks_open_deadline',
+	Tasks.project_id, Tasks.user_id, Tasks.deadline,
+	postgresql_where=(Tasks.status != TaskStatus.DONE)
+)
+
 """ Teams tables """
 class TeamRoles(StrEnum):
 	ADMIN = "admin"
@@ -109,6 +119,15 @@ class Teams(TeamBase, table=True):
 	user: "Users" = Relationship(back_populates="team")
 	project: "Projects" = Relationship(back_populates="team")
 
+""" One membership per user and project, also the index of membership lookups """
+Index('ix_teams_user_id_project_id', Teams.user_id, Teams.project_id, unique=True)
+
+""" A project of a user, with their role in its team """
+class ProjectWithRole(ProjectBase):
+	id: int
+	created_at: Optional[datetime] = None
+	changed_at: Optional[datetime] = None
+	role: TeamRoles
 
 """ Context table """
 class PromptTitle(StrEnum):
@@ -136,6 +155,23 @@ class Context(ContextBase, table=True):
 	changed_at: Optional[datetime] = Field(default=None)
 	project: "Projects" = Relationship(back_populates="context")
 
+""" Newest turns of a project's action first, serves the LLM context window """
+Index('ix_context_project_id_action_created_at', Context.project_id, Context.action, Context.created_at.desc())
+
+""" Compacted history of a project's action, one SYSTEM row each """
+Index(
+	'ix_context_summary',
+	Context.project_id, Context.action,
+	postgresql_where=(Context.role == MessageRole.SYSTEM)
+)
+
+""" Context rows folded into a summary """
+class ContextArchive(ContextBase, table=True):
+	id: int = Field(default=None, sa_column=Column(BigInteger(), primary_key=True, autoincrement=False))
+	project_id: int = Field(default=None, sa_column=Column(BigInteger(), ForeignKey('projects.id', ondelete='CASCADE'), index=True))
+	created_at: Optional[datetime] = Field(default=None)
+	archived_at: Optional[datetime] = Field(default_factory=lambda: datetime.now(timezone.utc))
+
 """ Prompt table """
 class Prompts(SQLModel, table=True):
 	id: Optional[int] = Field(default=None, primary_key=True)
@@ -171,3 +207,84 @@ class ReminderUpdate(SQLModel):
 class Reminders(ReminderBase, table=True):
 	created_at: Optional[datetime] = Field(default_factory=lambda: datetime.now(timezone.utc))
 	changed_at: Optional[datetime] = Field(default=None)
+
+""" Due-queue of the reminder scheduler """
+Index('ix_reminders_send_time', Reminders.send_time)
+
+class ReminderDeliveryStatus(StrEnum):
+	CLAIMED = "claimed"
+	SENT = "sent"
+	FAILED = "failed"
+
+""" Delivery of a reminder at its current send_time, a new send_time makes it due again """
+class ReminderDeliveries(SQLModel, table=True):
+	task_id: int = Field(default=None, sa_column=Column(BigInteger(), ForeignKey('reminders.task_id', ondelete='CASCADE'), primary_key=True))
+	send_time: Optional[datetime] = Field(default=None)
+	status: ReminderDeliveryStatus = Field(default=ReminderDeliveryStatus.CLAIMED)
+	attempts: int = Field(default=0)
+	claimed_until: Optional[datetime] = Field(default=None)
+	delivered_at: Optional[datetime] = Field(default=None)
+	error: Optional[str] = Field(default=None)
+
+
+""" Project statistics tables """
+class ProjectStats(SQLModel, table=True):
+	project_id: int = Field(default=None, sa_column=Column(BigInteger(), ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True))
+	total: int = Field(default=0)
+	todo: int = Field(default=0)
+	in_progress: int = Field(default=0)
+	done: int = Field(default=0)
+	overdue: int = Field(default=0)
+	reconciled_at: Optional[datetime] = Field(default=None)
+
+class DeveloperStats(SQLModel, table=True):
+	project_id: int = Field(default=None, sa_column=Column(BigInteger(), ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True))
+	user_id: int = Field(default=None, sa_column=Column(BigInteger(), ForeignKey('users.id', ondelete='CASCADE'), primary_key=True))
+	total: int = Field(default=0)
+	todo: int = Field(default=0)
+	in_progress: int = Field(default=0)
+	done: int = Field(default=0)
+	overdue: int = Field(default=0)
+
+
+""" LLM jobs queue table """
+class LlmJobStatus(StrEnum):
+	QUEUED = "queued"
+	RUNNING = "running"
+	DONE = "done"
+	FAILED = "failed"
+
+class LlmJobBase(SQLModel):
+	project_id: int = Field(default=None, sa_column=Column(BigInteger(), ForeignKey('projects.id', ondelete='CASCADE'), index=True))
+	action: PromptTitle = Field(default=None)
+	url: str = Field(default=None)
+	""" None routes by action like the blocking route does """
+	provider: Optional[str] = Field(default=None)
+	context_depth: int = Field(default=0)
+	timeout: int = Field(default=30)
+	status: LlmJobStatus = Field(default=LlmJobStatus.QUEUED)
+	attempts: int = Field(default=0)
+	result: Optional[dict] = Field(default=None, sa_type=JSON)
+	error: Optional[str] = Field(default=None)
+	created_at: Optional[datetime] = Field(default_factory=lambda: datetime.now(timezone.utc))
+	started_at: Optional[datetime] = Field(default=None)
+	finished_at: Optional[datetime] = Field(default=None)
+
+class LlmJobRead(LlmJobBase):
+	id: int
+
+class LlmJobs(LlmJobBase, table=True):
+	id: int = Field(default=None, sa_column=Column(BigInteger(), primary_key=True, autoincrement=True))
+	""" Upstream request without messages, they are built from context when the job runs """
+	request: dict = Field(default=None, sa_type=JSON)
+	""" Needed by whichever worker runs the job, cleared once it is finished """
+	iam_token: Optional[str] = Field(default=None)
+	""" A running job whose lease expired is taken over by another worker """
+	locked_until: Optional[datetime] = Field(default=None)
+
+""" Jobs still to be run, serves the workers' claims """
+Index(
+	'ix_llmjobs_pending',
+	LlmJobs.id,
+	postgresql_where=LlmJobs.status.in_([LlmJobStatus.QUEUED, LlmJobStatus.RUNNING])
+)
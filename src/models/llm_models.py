@@ -1,6 +1,6 @@
 from enum import StrEnum
-from typing import List, Optional
-from pydantic import BaseModel
+from typing import Annotated, Dict, List, Optional
+from pydantic import BaseModel, StringConstraints, TypeAdapter
 
 class CompletionOptions(BaseModel):
 	stream: bool = False	
@@ -19,4 +19,11 @@ class ProblemRequest(BaseRequest):
 	problem: str
 
 class OptionsRequest(BaseRequest):
-	options: CompletionOptions
\ No newline at end of file
+	options: CompletionOptions
+
+""" One item of the generated "tasks" array: {"<number>": "<description>"}, names leave room for the "task_" title prefix """
+GeneratedTask = Dict[
+	Annotated[str, StringConstraints(strip_whitespace=True, min_length=1, max_length=59)],
+	Annotated[str, StringConstraints(strip_whitespace=True, min_length=1, max_length=8192)]
+]
+generated_task = TypeAdapter(GeneratedTask)
@@ -0,0 +1,113 @@
+""" SQLModel imports """
+from sqlalchemy import and_, delete, desc, func, insert, select
+""" typing imports """
+from typing import Callable, List, Optional, Sequence
+""" asyncio imports """
+import asyncio
+import traceback
+""" Internal imports """
+from core.db import SessionDep, get_session
+from core.config import CONTEXT_COMPACT_AFTER, CONTEXT_KEEP_TURNS, CONTEXT_SUMMARY_CHARS
+from core.metrics import metrics
+from models.db_models import Context, ContextArchive, MessageRole, PromptTitle
+
+
+""" Folds the previous summary (if any) and older turns into a new summary """
+Summarizer = Callable[[Optional[str], Sequence[Context]], str]
+
+""" Any constant shared by all workers, so only one of them compacts at a time """
+COMPACT_LOCK_ID = 0x7468726561647902
+TURN_EXCERPT_CHARS = 200
+ARCHIVED_COLUMNS = ('id', 'project_id', 'role', 'action', 'message', 'created_at')
+
+
+def extractive_summary(previous: Optional[str], turns: Sequence[Context]) -> str:
+	""" Keeps the opening line of every answer, dropping repeated lines and then the oldest ones
+	past CONTEXT_SUMMARY_CHARS. User turns are skipped: they open with the same action prompt,
+	which is sent again with every request anyway.
+	Needs no upstream call, so compaction never depends on LLM credentials """
+	lines = previous.splitlines() if previous else []
+	for turn in turns:
+		if turn.role == MessageRole.USER:
+			continue
+		excerpt = (turn.message or '').strip().split('\n', 1)[0][:TURN_EXCERPT_CHARS]
+		if excerpt:
+			lines.append(f"{turn.role}: {excerpt}")
+	""" The latest occurrence of a line is the one kept """
+	lines = list(reversed(dict.fromkeys(reversed(lines))))
+
+	size = 0
+	kept: List[str] = []
+	for line in reversed(lines):
+		size += len(line) + 1
+		if size > CONTEXT_SUMMARY_CHARS:
+			break
+		kept.append(line)
+	return '\n'.join(reversed(kept))
+
+
+async def compact_context(
+	s: SessionDep, project_id: int, action: PromptTitle,
+	summarize: Summarizer = extractive_summary) -> int:
+	""" Moves all but the newest CONTEXT_KEEP_TURNS turns to ContextArchive,
+	leaving one SYSTEM summary row in their place. Returns the number of turns folded """
+	group = and_(Context.project_id == project_id, Context.action == action)
+	cutoff = (await s.exec(
+		select(Context.created_at)
+		.where(group, Context.role != MessageRole.SYSTEM)
+		.order_by(desc(Context.created_at))
+		.offset(CONTEXT_KEEP_TURNS)
+		.limit(1))).scalar()
+	if cutoff is None:
+		return 0
+
+	older = and_(group, Context.created_at <= cutoff)
+	rows = (await s.exec(select(Context).where(older).order_by(Context.created_at))).scalars().all()
+	summaries = [ row for row in rows if row.role == MessageRole.SYSTEM ]
+	turns = [ row for row in rows if row.role != MessageRole.SYSTEM ]
+	summary = summarize(summaries[-1].message if summaries else None, turns)
+
+	archived = select(*(Context.__table__.c[name] for name in ARCHIVED_COLUMNS)).where(older)
+	await s.exec(insert(ContextArchive).from_select(ARCHIVED_COLUMNS, archived))
+	await s.exec(delete(Context).where(older))
+	""" Summary sorts before every turn it did not fold """
+	s.add(Context(
+		project_id=project_id, role=MessageRole.SYSTEM,
+		action=action, message=summary, created_at=turns[-1].created_at))
+	await s.flush()
+	return len(turns)
+
+
+async def compact(s: SessionDep, summarize: Summarizer = extractive_summary) -> Optional[int]:
+	""" Compacts every project action past CONTEXT_COMPACT_AFTER turns.
+	Returns the number of turns folded, or None if another worker holds the lock """
+	locked = (await s.exec(select(func.pg_try_advisory_xact_lock(COMPACT_LOCK_ID)))).scalar()
+	if not locked:
+		return None
+
+	groups = (await s.exec(
+		select(Context.project_id, Context.action)
+		.where(Context.role != MessageRole.SYSTEM)
+		.group_by(Context.project_id, Context.action)
+		.having(func.count() > CONTEXT_COMPACT_AFTER))).all()
+	folded = 0
+	for project_id, action in groups:
+		folded += await compact_context(s, project_id, action, summarize)
+	return folded
+
+async def run_compaction(interval: float, summarize: Summarizer = extractive_summary) -> None:
+	""" Periodic job: keeps Context bounded per project action """
+	while True:
+		try:
+			async with get_session() as s:
+				folded = await compact(s, summarize)
+				await s.commit()
+			if folded is not None:
+				metrics.inc('context.compactions')
+				metrics.inc('context.turns_archived', folded)
+		except asyncio.CancelledError:
+			raise
+		except Exception:
+			metrics.inc('context.compaction_errors')
+			traceback.print_exc()
+		await asyncio.sleep(interval)
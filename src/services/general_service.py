@@ -1,15 +1,26 @@
 """ SQLModel imports """
 from enum import StrEnum
-from sqlalchemy import ColumnElement
-from sqlmodel import Session, and_, asc, between, desc, select, col
+from sqlalchemy import ColumnElement, func, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import raiseload
+from sqlmodel import SQLModel, Session, and_, asc, between, desc, select, col
 #from sympy import ExactQuotientFailed
+""" asyncio imports """
+import asyncio
+""" psycopg imports """
+from psycopg.errors import UniqueViolation
 """ typing imports """
-from typing import List, Optional, Sequence, Type, TypeVar, Union
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Type, TypeVar, Union
 """ datetime imports """
 from datetime import datetime, timezone
 """ Internal imports """
-from core import db
+from core import db, events
 from core.db import SessionDep
+from core.cache import CacheBackend, LocalCacheBackend
+from core.config import CONTEXT_CHARS_PER_TOKEN, CONTEXT_TOKEN_BUDGET, ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL, EXPORT_BATCH_SIZE, PAGE_SIZE
+from core.metrics import metrics
+from services import membership_service as membership
+from services import stats_service as stats
 from models.db_models import (
   Context,
   ContextBase,
@@ -19,8 +30,11 @@ from models.db_models import (
   Plans,
   ProjectBase,
   ProjectUpdate,
+  ProjectWithRole,
   PromptTitle,
   TaskBase,
+  TaskPriority,
+  TaskStatus,
   TaskUpdate,
   Tasks, TeamBase,
   TeamRoles,
@@ -31,17 +45,140 @@ from models.db_models import (
 )
 
 """ Util """
+def task_event(type: str, project_id: int, task_id: int) -> dict:
+	""" Events carry ids only, clients fetch what they need """
+	return { 'type': type, 'project_id': project_id, 'task_id': task_id }
+
+def team_event(type: str, team: Teams) -> dict:
+	return { 'type': type, 'project_id': team.project_id, 'user_id': team.user_id, 'role': team.role }
+
 async def is_present_by_id(s: SessionDep, table: type, id: int) -> bool:
-	return s.exec(select(table).where(table.id == id)).first() is not None
+	return (await s.exec(select(table).where(table.id == id))).first() is not None
 
 async def is_admin(s: SessionDep, user_id: int, project_id: int) -> bool:
-	user = (s.exec(
-			select(Teams)
-   		.where(and_(Teams.user_id == user_id, Teams.project_id == project_id)))
-			.first())
-	if user:
-		return user.role == TeamRoles.ADMIN
-	return False
+	""" Answered from the membership map, without a query """
+	return membership.is_admin(user_id, project_id)
+
+def is_unique_violation(e: IntegrityError) -> bool:
+	return isinstance(e.orig, UniqueViolation)
+
+
+#*
+#*	Entity cache
+#*
+""" Read-through cache of the lookups made on almost every request. Values are the rows
+as dicts, so the backend may live outside the process (see core.cache.CacheBackend) """
+entity_cache: CacheBackend = LocalCacheBackend(ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL)
+CACHE_INVALIDATE_EVENT = 'cache.invalidate'
+""" Keys per invalidation event, keeping each NOTIFY payload well under its 8000 byte limit """
+CACHE_INVALIDATE_BATCH = 100
+_invalidations: Set[asyncio.Task] = set()
+
+def _hit_ratio() -> float:
+	hits, misses = metrics.counter('cache.entities.hits'), metrics.counter('cache.entities.misses')
+	return hits / (hits + misses) if hits + misses else 0.0
+
+metrics.gauge('cache.entities.hit_ratio', _hit_ratio)
+
+def set_entity_cache(backend: CacheBackend) -> None:
+	global entity_cache
+	entity_cache = backend
+
+def _dirty(s: SessionDep) -> Set[str]:
+	""" Keys this session has written, its reads of them bypass the cache until it ends """
+	return s.info.setdefault('cache.dirty', set())
+
+async def cached(s: SessionDep, key: str, load: Callable[[], Awaitable[Any]]) -> Any:
+	""" Returns the cached value of key, or loads and caches it. None is never cached """
+	if key in _dirty(s):
+		return await load()
+	value = await entity_cache.get(key)
+	if value is not None:
+		metrics.inc('cache.entities.hits')
+		return value
+	metrics.inc('cache.entities.misses')
+	value = await load()
+	if value is not None:
+		await entity_cache.set(key, value)
+	return value
+
+async def invalidate(s: SessionDep, keys: List[str]) -> None:
+	""" Drops keys now, and again in every worker once the transaction commits,
+	so that a value read meanwhile from the old row does not stay cached """
+	_dirty(s).update(keys)
+	await entity_cache.delete(keys)
+	await events.publish(s, [ { 'type': CACHE_INVALIDATE_EVENT, 'keys': keys[i:i + CACHE_INVALIDATE_BATCH] }
+		for i in range(0, len(keys), CACHE_INVALIDATE_BATCH) ], internal=True)
+
+def _on_event(event: Dict) -> None:
+	if event.get('type') == CACHE_INVALIDATE_EVENT:
+		task = asyncio.create_task(entity_cache.delete(event['keys']))
+		_invalidations.add(task)
+		task.add_done_callback(_invalidations.discard)
+
+events.bus.add_handler(_on_event)
+""" Invalidations sent while not listening are lost """
+events.bus.add_resync(lambda: entity_cache.clear())
+
+def user_key(id: int) -> str:
+	return f'user:{id}'
+
+def project_key(id: int) -> str:
+	return f'project:{id}'
+
+def team_key(project_id: int) -> str:
+	return f'team:{project_id}'
+
+
+async def bulk_insert(
+		s: SessionDep, table: type, items: Union[List[SQLModel], Sequence[SQLModel]], returning: ColumnElement
+	) -> Sequence[int]:
+	""" Single multi-row INSERT ... RETURNING, keys come back in input order """
+	if not items:
+		return tuple()
+	rows = [ table(**item.model_dump()).model_dump(exclude={'id'}) for item in items ]
+	q = insert(table).returning(returning, sort_by_parameter_order=True)
+	return tuple((await s.exec(q, params=rows)).scalars().all())
+
+
+def paginate(q, key: ColumnElement, after_id: Optional[int], limit: Optional[int]):
+	""" Keyset page: rows with key > after_id, in key order """
+	if after_id is not None:
+		q = q.where(key > after_id)
+	q = q.order_by(key)
+	if limit:
+		q = q.limit(limit)
+	return q
+
+def filter_tasks(
+		q,
+		status: Optional[TaskStatus] = None,
+		priority: Optional[TaskPriority] = None,
+		user_id: Optional[int] = None,
+		deadline_from: Optional[datetime] = None,
+		deadline_to: Optional[datetime] = None
+	):
+	if status is not None:
+		q = q.where(Tasks.status == status)
+	if priority is not None:
+		q = q.where(Tasks.priority == priority)
+	if user_id is not None:
+		q = q.where(Tasks.user_id == user_id)
+	if deadline_from is not None:
+		q = q.where(Tasks.deadline >= deadline_from)
+	if deadline_to is not None:
+		q = q.where(Tasks.deadline < deadline_to)
+	return q
+
+
+async def stream_ndjson(q) -> AsyncIterator[str]:
+	""" Streams the query's rows as NDJSON from a server-side cursor.
+	Runs in its own session, the request session is closed before a streamed body is sent """
+	async with db.get_session() as s:
+		q = q.options(raiseload('*')).execution_options(yield_per=EXPORT_BATCH_SIZE)
+		rows = await s.stream_scalars(q)
+		async for partition in rows.partitions():
+			yield ''.join(row.model_dump_json() + '\n' for row in partition)
 
 
 class SortBy(StrEnum):
@@ -55,47 +192,49 @@ class SortBy(StrEnum):
 #*
 
 """ GET """
-async def get_all_users(s: SessionDep) -> Sequence[Users]:
-	return s.exec(select(Users)).all()
+async def get_all_users(
+		s: SessionDep, after_id: Optional[int] = None, limit: Optional[int] = PAGE_SIZE
+	) -> Sequence[Users]:
+	return (await s.exec(paginate(select(Users), Users.id, after_id, limit))).all()
 
 async def get_user_by_id(s: SessionDep, id: int) -> Optional[Users]:
-	return s.exec(select(Users).where(Users.id == id)).first()
+	async def load() -> Optional[Dict]:
+		user = (await s.exec(select(Users).where(Users.id == id))).first()
+		return user.model_dump() if user else None
+	user = await cached(s, user_key(id), load)
+	return Users.model_validate(user) if user else None
 
 async def get_users_by_ids(
 		s: SessionDep, ids: Union[List[int], Sequence[int]]
   ) -> Sequence[Users]:
 	query = select(Users).where(col(Users.id).in_(ids))
-	users = s.exec(query).all()
+	users = (await s.exec(query)).all()
 	return users
 
 """ CREATE """
 async def create_user(s: SessionDep, user: UserBase) -> int:
 	user = Users(**user.model_dump())
 	s.add(user)
-	s.commit()
-	s.refresh(user)
+	await s.flush()
 	return user.id
 
 async def create_users(s: SessionDep, users: Union[List[UserBase], Sequence[UserBase]]) -> Sequence[int]:
-	ids: List[int] = []
-	parsed_users: List[Users] = []
-
-	for user in users:
-			user_obj = Users(**user.model_dump())
-			parsed_users.append(user_obj)
-	s.add_all(parsed_users)
-	s.commit()
-	for user in parsed_users:
-		s.refresh(user)
-		ids.append(user.id)
-	return ids
+	return await bulk_insert(s, Users, users, Users.id)
 
 """ DELETE """
 async def delete_user_by_id(s: SessionDep, id: int) -> int:
 	query = select(Users).where(Users.id == id)
-	user = s.exec(query).first()
-	s.delete(user)
-	s.commit()
+	user = (await s.exec(query)).first()
+	""" Owned projects and memberships go with the user, their cached rows must too """
+	owned = (await s.exec(select(Projects.id).where(Projects.owner_id == id))).all()
+	joined = (await s.exec(select(Teams.project_id).where(Teams.user_id == id))).all()
+	await s.delete(user)
+	await s.flush()
+	await invalidate(s, [user_key(id), *map(project_key, owned), *map(team_key, set(owned) | set(joined))])
+	await membership.publish(s, [
+		{ 'type': membership.USER_DELETED, 'user_id': id },
+		*({ 'type': membership.PROJECT_DELETED, 'project_id': project_id } for project_id in owned)
+	])
 	return id
 
 
@@ -104,11 +243,13 @@ async def delete_user_by_id(s: SessionDep, id: int) -> int:
 #*
 
 """ GET """
-async def get_all_projects(s: SessionDep) -> Sequence[Projects]:
-	return s.exec(select(Projects)).all()
+async def get_all_projects(
+		s: SessionDep, after_id: Optional[int] = None, limit: Optional[int] = PAGE_SIZE
+	) -> Sequence[Projects]:
+	return (await s.exec(paginate(select(Projects), Projects.id, after_id, limit))).all()
 
 async def get_projects_by_owner_id(s: SessionDep, owner_id: int) -> Optional[Sequence[Projects]]:
-	return s.exec(select(Projects).where(Projects.owner_id == owner_id)).all()
+	return (await s.exec(select(Projects).where(Projects.owner_id == owner_id))).all()
 
 # async def get_projects_by_id_where_user_is_admin(s: SessionDep, id: int) -> Optional[Projects]:
 # 	return s.exec(select(Projects).where(Projects.id == id)).first()
@@ -117,51 +258,58 @@ async def get_projects_by_owner_id(s: SessionDep, owner_id: int) -> Optional[Seq
 # 	return s.exec(select(Projects).where(Projects.id == id)).first()
 
 async def get_project_by_id(s: SessionDep, id: int) -> Optional[Projects]:
-	return s.exec(select(Projects).where(Projects.id == id)).first()
-
-async def get_projects_by_user_id(s: SessionDep, id: int) -> Sequence[Projects]:
-	q = select(Teams).where(Teams.user_id == id)
-	teams = s.exec(q).all()
-
-	_ids = [ ]
-	for team in teams:
-		_ids.append(team.project_id)
-
-	q = select(Projects)
-	projects = s.exec(q.where(col(Projects.id).in_(_ids))).all()
-
-	return projects
+	async def load() -> Optional[Dict]:
+		project = (await s.exec(select(Projects).where(Projects.id == id))).first()
+		return project.model_dump() if project else None
+	project = await cached(s, project_key(id), load)
+	return Projects.model_validate(project) if project else None
+
+async def get_projects_by_user_id(
+		s: SessionDep, id: int, after_id: Optional[int] = None, limit: Optional[int] = PAGE_SIZE
+	) -> List[ProjectWithRole]:
+	""" One query walking the user's memberships in project order (ix_teams_user_id_project_id),
+	columns only, so the eager owner join of Projects stays out of it """
+	q = (select(*Projects.__table__.c, Teams.role)
+			.join(Teams, Teams.project_id == Projects.id)
+			.where(Teams.user_id == id))
+	rows = (await s.exec(paginate(q, Teams.project_id, after_id, limit))).all()
+	return [ ProjectWithRole.model_validate(row._mapping) for row in rows ]
 
 
 """ CREATE """
 async def create_project(s: SessionDep, project: ProjectBase) -> int:
 	project = Projects(**project.model_dump())
 	s.add(project)
-	s.commit()
-	s.refresh(project)
+	await s.flush()
+	await stats.create_project_stats(s, project.id)
 	return project.id
 
 """ DELETE """
 async def delete_project_by_id(s: SessionDep, project_id: int) -> int:
 	query = select(Projects).where(Projects.id == project_id)
-	project = s.exec(query).one()
-	s.delete(project)
-	s.commit()
+	project = (await s.exec(query)).one()
+	await s.delete(project)
+	await s.flush()
+	await invalidate(s, [project_key(project_id), team_key(project_id)])
+	await membership.publish(s, [{ 'type': membership.PROJECT_DELETED, 'project_id': project_id }])
 	return project_id
 
 async def delete_projects_by_owner_id(s: SessionDep, owner_id: int) -> Sequence[int]:
 		proj_ids: List[int]
 		query = select(Projects).where(Projects.owner_id == owner_id)
-		projects = s.exec(query).all()
+		projects = (await s.exec(query)).all()
 		proj_ids = [ proj.id for proj in projects ]
-		s.delete(projects)
-		s.commit()
+		for proj in projects:
+			await s.delete(proj)
+		await s.flush()
+		await invalidate(s, [ key for id in proj_ids for key in (project_key(id), team_key(id)) ])
+		await membership.publish(s, [ { 'type': membership.PROJECT_DELETED, 'project_id': id } for id in proj_ids ])
 		return proj_ids
 
 """ UPDATE """
 async def update_project_by_id(s: SessionDep, project_id: int, update: ProjectUpdate) -> int:
 	query = select(Projects).where(Projects.id == project_id)
-	project = s.exec(query).one()
+	project = (await s.exec(query)).one()
 
 	if update.title is not None:
 		project.title = update.title
@@ -172,8 +320,8 @@ async def update_project_by_id(s: SessionDep, project_id: int, update: ProjectUp
 	if update.chat_link is not None:
 		project.chat_link = update.chat_link
 
-	s.commit()
-	s.refresh(project)
+	await s.flush()
+	await invalidate(s, [project_key(project.id)])
 	return project.id
 
 
@@ -181,40 +329,47 @@ async def update_project_by_id(s: SessionDep, project_id: int, update: ProjectUp
 #*	Tasks table
 #*
 """ GET """
-async def get_all_tasks(s: SessionDep) -> Sequence[Tasks]:
-	return s.exec(select(Tasks)).all()
-
-async def get_all_task_by_project_id(s: SessionDep, project_id: int) -> Sequence[Tasks]:
-	return s.exec(select(Tasks).where(Tasks.project_id == project_id)).all()
+async def get_all_tasks(
+		s: SessionDep, after_id: Optional[int] = None, limit: Optional[int] = PAGE_SIZE, **filters
+	) -> Sequence[Tasks]:
+	q = filter_tasks(select(Tasks), **filters)
+	return (await s.exec(paginate(q, Tasks.id, after_id, limit))).all()
+
+async def get_all_task_by_project_id(
+		s: SessionDep, project_id: int,
+		after_id: Optional[int] = None, limit: Optional[int] = PAGE_SIZE, **filters
+	) -> Sequence[Tasks]:
+	q = filter_tasks(select(Tasks).where(Tasks.project_id == project_id), **filters)
+	return (await s.exec(paginate(q, Tasks.id, after_id, limit))).all()
 
 async def get_task_by_id(s: SessionDep, id: int) -> Optional[Tasks]:
-	return s.exec(select(Tasks).where(Tasks.id == id)).first()
+	return (await s.exec(select(Tasks).where(Tasks.id == id))).first()
+
+def export_tasks_by_project_id(project_id: int) -> AsyncIterator[str]:
+	return stream_ndjson(select(Tasks).where(Tasks.project_id == project_id).order_by(Tasks.id))
 
 """ CREATE """
 async def create_task(s: SessionDep, task: TaskBase) -> int:
 	task = Tasks(**task.model_dump())
 	s.add(task)
-	s.commit()
-	s.refresh(task)
+	await s.flush()
+	await stats.apply_tasks(s, [task], 1)
+	await events.publish(s, [task_event('task.created', task.project_id, task.id)])
 	return task.id
 
 async def create_tasks(s: SessionDep, tasks: Union[List[TaskBase], Sequence[TaskBase]]) -> Sequence[int]:
-	_tasks = [ Tasks(**_task.model_dump()) for _task in tasks ]
-	_ids: List[int] = [ ]
-	s.add_all(_tasks)
-	s.commit()
-
-	for task in _tasks:
-		s.refresh(task)
-		_ids.append(task.id)
-	return tuple(_ids)
+	ids = await bulk_insert(s, Tasks, tasks, Tasks.id)
+	await stats.apply_tasks(s, tasks, 1)
+	await events.publish(s, [ task_event('task.created', task.project_id, id) for task, id in zip(tasks, ids) ])
+	return ids
 
 """ UPDATE """
 async def update_task_by_id(s: SessionDep, task_id: int, upd: TaskUpdate) -> int:
 	q = select(Tasks).where(Tasks.id == task_id)
-	task = s.exec(q).first()
+	task = (await s.exec(q)).first()
 
 	if task:
+		before = stats.snapshot(task)
 		if upd.title: task.title = upd.title
 		if upd.description: task.description = upd.description
 		if upd.deadline: task.deadline = upd.deadline
@@ -225,16 +380,20 @@ async def update_task_by_id(s: SessionDep, task_id: int, upd: TaskUpdate) -> int
 	else:
 		return -1
 
-	s.commit()
-	s.refresh(task)
+	await s.flush()
+	await stats.apply_tasks(s, [before], -1)
+	await stats.apply_tasks(s, [task], 1)
+	await events.publish(s, [task_event('task.updated', task.project_id, task.id)])
 	return task.id
 
 """ DELETE """
 async def delete_task_by_id(s: SessionDep, task_id: int) -> int:
 	q = select(Tasks).where(Tasks.id == task_id)
-	task = s.exec(q).one()
-	s.delete(task)
-	s.commit()
+	task = (await s.exec(q)).one()
+	await stats.apply_tasks(s, [task], -1)
+	await events.publish(s, [task_event('task.deleted', task.project_id, task_id)])
+	await s.delete(task)
+	await s.flush()
 	return task_id
 
 
@@ -242,29 +401,35 @@ async def delete_task_by_id(s: SessionDep, task_id: int) -> int:
 #*	Teams table
 #*
 """ GET """
-async def get_all_teams(s: SessionDep) -> Sequence[Teams]:
-	return s.exec(select(Teams)).all()
+async def get_all_teams(
+		s: SessionDep, after_id: Optional[int] = None, limit: Optional[int] = PAGE_SIZE
+	) -> Sequence[Teams]:
+	return (await s.exec(paginate(select(Teams), Teams.id, after_id, limit))).all()
 
 async def get_team_by_project_id(s: SessionDep, project_id: int) -> Sequence[Teams]:
-	return s.exec(select(Teams).where(Teams.project_id == project_id)).all()
+	async def load() -> List[Dict]:
+		return [ team.model_dump() for team in (await s.exec(select(Teams).where(Teams.project_id == project_id))).all() ]
+	return [ Teams.model_validate(team) for team in await cached(s, team_key(project_id), load) ]
 
 async def get_team_by_id(s: SessionDep, id: int) -> Teams:
-	return s.exec(select(Teams).where(Teams.id == id)).one()
+	return (await s.exec(select(Teams).where(Teams.id == id))).one()
 
 """ CREATE """
 async def create_team(s: SessionDep, team: TeamBase) -> int:
 	team = Teams(**team.model_dump())
 	s.add(team)
-	s.commit()
-	s.refresh(team)
+	await s.flush()
+	await invalidate(s, [team_key(team.project_id)])
+	await membership.publish(s, [team_event(membership.TEAM_JOINED, team)])
 	return team.id
 
 async def add_user_to_team(s: SessionDep, team: TeamBase) -> int:
 	team = Teams(**team.model_dump())
 	team.role = TeamRoles.USER
 	s.add(team)
-	s.commit()
-	s.refresh(team)
+	await s.flush()
+	await invalidate(s, [team_key(team.project_id)])
+	await membership.publish(s, [team_event(membership.TEAM_JOINED, team)])
 	return team.id
 
 """ UPDATE """
@@ -279,11 +444,12 @@ async def update_team_by_(
 	if team_id is not None:
 		q = q.where(Teams.id == team_id)
 
-	team = s.exec(q).one()
+	team = (await s.exec(q)).one()
 	team.role = upd.role
 
-	s.commit()
-	s.refresh(team)
+	await s.flush()
+	await invalidate(s, [team_key(team.project_id)])
+	await membership.publish(s, [team_event(membership.TEAM_UPDATED, team)])
 	return team.id
 
 """ DELETE """
@@ -297,11 +463,13 @@ async def delete_team_by_(
 		q = select(Teams).where(and_(Teams.user_id == user_id, Teams.project_id == project_id))
 	if team_id is not None:
 		q = select(Teams).where(Teams.id == team_id)
-	team = s.exec(q).first()
+	team = (await s.exec(q)).first()
 	if team is not None:
 		ret_id = team.id
-	s.delete(team)
-	s.commit()
+	await s.delete(team)
+	await s.flush()
+	await invalidate(s, [team_key(team.project_id)])
+	await membership.publish(s, [team_event(membership.TEAM_LEFT, team)])
 	return ret_id
 
 
@@ -313,25 +481,44 @@ async def get_context_by_project_id(
 	s: SessionDep,
 	project_id: int,
 	action: PromptTitle,
-	context_depth: int
+	context_depth: int,
+	token_budget: int = CONTEXT_TOKEN_BUDGET
 ) -> List[dict]:
-	""" Gets the latest messages with specified depth """
-	query = select(Context)
-	_context = [ ]
-
-	""" query based on needed action """
-	if action in [PromptTitle.PLAN, PromptTitle.RE_PLAN, PromptTitle.TASK]:
-		query = query.where(and_(Context.project_id == project_id, Context.action == 'plan'))
+	""" Gets the compacted summary, then the latest messages, at most context_depth of them
+	and together within token_budget, oldest first """
+	context_action = PromptTitle.PLAN
 	if action in [PromptTitle.RE_TASK, PromptTitle.DIV_TASK]:
-		query = query.where(and_(Context.project_id == project_id, Context.action == 'task'))
+		context_action = PromptTitle.TASK
+	group = and_(Context.project_id == project_id, Context.action == context_action)
+	_context = [ ]
+	budget = token_budget * CONTEXT_CHARS_PER_TOKEN
+
+	""" Summary of compacted turns """
+	summary = (await s.exec(select(Context.message).where(group, Context.role == MessageRole.SYSTEM))).first()
+	if summary:
+		_context.append({'role': MessageRole.SYSTEM, 'text': summary})
+		budget -= len(summary)
+
+	""" Newest first along the index, with the running size of the window """
+	newest = (
+		select(
+			Context.role, Context.message, Context.created_at,
+			func.sum(func.length(Context.message)).over(order_by=desc(Context.created_at)).label('chars'))
+		.where(group, Context.role != MessageRole.SYSTEM)
+		.order_by(desc(Context.created_at))
+		.limit(context_depth)
+		.subquery())
+	query = (select(newest.c.role, newest.c.message)
+			.where(newest.c.chars <= budget)
+			.order_by(newest.c.created_at))
 
-	""" gets context """
-	contexts = s.exec(query.order_by(desc(Context.changed_at)).limit(context_depth)).all()
 	""" building context list """
-	for context in contexts:
-		_context.append({'role': context.role, 'text': context.message})
+	_context.extend({'role': role, 'text': message} for role, message in (await s.exec(query)).all())
 	return _context
 
+def export_context_by_project_id(project_id: int) -> AsyncIterator[str]:
+	return stream_ndjson(select(Context).where(Context.project_id == project_id).order_by(Context.id))
+
 
 """ CREATE """
 async def create_context(
@@ -340,8 +527,7 @@ async def create_context(
 ) -> int:
 	_context = Context(**context.model_dump())
 	s.add(_context)
-	s.commit()
-	s.refresh(_context)
+	await s.flush()
 	return _context.project_id
 
 #*
@@ -365,7 +551,7 @@ async def get_plans_by_project_id(
 		case SortBy.OLDER:
 			q = q.order_by(asc(Plans.created_at))
 
-	plans = s.exec(q).all()
+	plans = (await s.exec(q)).all()
 	return plans
 
 """ CREATE """
@@ -375,43 +561,36 @@ async def create_plan(
 ) -> int:
 	plan = Plans(**plan.model_dump())
 	s.add(plan)
-	s.commit()
-	s.refresh(plan)
+	await s.flush()
 	return plan.id
 
 #*
 #* Reminders table
 #*
 
-async def get_all_reminders(s: SessionDep) -> Sequence[Reminders]:
-	return s.exec(select(Reminders)).all()
+async def get_all_reminders(
+		s: SessionDep, after_id: Optional[int] = None, limit: Optional[int] = PAGE_SIZE
+	) -> Sequence[Reminders]:
+	""" Reminders are keyed by task_id, after_id refers to it """
+	return (await s.exec(paginate(select(Reminders), Reminders.task_id, after_id, limit))).all()
 
 async def get_reminders_by_project_ids(s: SessionDep, project_ids: Union[List[int], Sequence[int]]) -> Sequence[Reminders]:
 	query = select(Reminders).where(col(Reminders.project_id).in_(project_ids))
-	reminders = s.exec(query).all()
+	reminders = (await s.exec(query)).all()
 	return reminders
 
 async def create_remider(s: SessionDep, reminder: ReminderBase) -> int:
 	reminder = Reminders(**reminder.model_dump())
 	s.add(reminder)
-	s.commit()
-	s.refresh(reminder)
+	await s.flush()
 	return reminder.task_id
 
-async def create_remiders(s: SessionDep, reminders: List[ReminderBase]) -> Sequence[int]:
-	reminders = [ Reminders(**reminder.model_dump()) for reminder in reminders ]
-	s.add_all(reminders)
-	s.commit()
-	_ids: List[int] = [ ]
-
-	for rem in reminders:
-		s.refresh(rem)
-		_ids.append(rem.task_id)
-	return tuple(_ids)
+async def create_remiders(s: SessionDep, reminders: Union[List[ReminderBase], Sequence[ReminderBase]]) -> Sequence[int]:
+	return await bulk_insert(s, Reminders, reminders, Reminders.task_id)
 
 async def update_reminder_by_task_id(s: SessionDep, task_id: int, upd: ReminderUpdate) -> int:
 	q = select(Reminders).where(Reminders.task_id == task_id)
-	rem = s.exec(q).one()
+	rem = (await s.exec(q)).one()
 
 	if rem:
 		if upd.title: rem.title = upd.title
@@ -421,20 +600,19 @@ async def update_reminder_by_task_id(s: SessionDep, task_id: int, upd: ReminderU
 		return -1
 
 	rem.changed_at = datetime.now(timezone.utc)
-	s.commit()
-	s.refresh(rem)
+	await s.flush()
 	return rem.task_id
 
 async def delete_reminder_by_task_id(s: SessionDep, task_id: int) -> int:
 	q = select(Reminders).where(Reminders.task_id == task_id)
-	reminder = s.exec(q).one()
-	s.delete(reminder)
-	s.commit()
+	reminder = (await s.exec(q)).one()
+	await s.delete(reminder)
+	await s.flush()
 	return task_id
 
 async def exist_reminder_by_task_id(s: SessionDep, task_id: int) ->bool:
 	q = select(Reminders).where(Reminders.task_id == task_id)
-	reminder = s.exec(q).first()
+	reminder = (await s.exec(q)).first()
 	if reminder:
 		return True
 	else:
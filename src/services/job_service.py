@@ -0,0 +1,179 @@
+""" SQLModel imports """
+from sqlalchemy import and_, func, or_, select, update
+""" httpx import """
+import httpx
+""" typing imports """
+from typing import Optional
+""" datetime imports """
+from datetime import timedelta
+""" asyncio imports """
+import asyncio
+import traceback
+""" Internal imports """
+from core.db import SessionDep, get_session, listen
+from core.config import LLM_JOB_LEASE, LLM_JOB_MAX_ATTEMPTS, LLM_JOB_POLL_INTERVAL
+from core.limiter import Priority
+from core.metrics import metrics
+from services import llm_service
+from services.llm_providers import get_provider
+from models.db_models import LlmJobs, LlmJobStatus
+
+
+""" Workers are woken up by a notification on this channel when a job is submitted """
+JOBS_CHANNEL = 'thready_llm_jobs'
+_submitted = asyncio.Event()
+
+
+def _now():
+	""" Naive UTC like every other timestamp, computed by the database so all workers agree """
+	return func.timezone('UTC', func.now())
+
+def _expired_lease():
+	return and_(LlmJobs.status == LlmJobStatus.RUNNING, LlmJobs.locked_until < _now())
+
+
+async def submit(s: SessionDep, job: LlmJobs) -> int:
+	s.add(job)
+	await s.flush()
+	await s.exec(select(func.pg_notify(JOBS_CHANNEL, str(job.id))))
+	metrics.inc('llm.jobs.submitted')
+	return job.id
+
+async def get_job_by_id(s: SessionDep, id: int) -> Optional[LlmJobs]:
+	return (await s.exec(select(LlmJobs).where(LlmJobs.id == id))).scalars().first()
+
+
+def _lease():
+	return _now() + timedelta(seconds=LLM_JOB_LEASE)
+
+def _owned(job: LlmJobs):
+	""" Still the claim of this worker: a takeover after an expired lease counts another attempt """
+	return and_(LlmJobs.id == job.id, LlmJobs.attempts == job.attempts, LlmJobs.status == LlmJobStatus.RUNNING)
+
+
+async def claim(s: SessionDep) -> Optional[LlmJobs]:
+	""" Takes the oldest queued job, or a running one whose worker stopped renewing it.
+	SKIP LOCKED lets any number of workers claim concurrently without waiting on each other """
+	pending = (select(LlmJobs.id)
+			.where(or_(LlmJobs.status == LlmJobStatus.QUEUED, _expired_lease()))
+			.where(LlmJobs.attempts < LLM_JOB_MAX_ATTEMPTS)
+			.order_by(LlmJobs.id)
+			.limit(1)
+			.with_for_update(skip_locked=True)
+			.scalar_subquery())
+	q = (update(LlmJobs)
+			.where(LlmJobs.id == pending)
+			.values(
+				status=LlmJobStatus.RUNNING,
+				attempts=LlmJobs.attempts + 1,
+				started_at=_now(),
+				locked_until=_lease())
+			.returning(LlmJobs))
+	return (await s.exec(q)).scalars().first()
+
+async def give_up_abandoned(s: SessionDep) -> None:
+	""" Fails jobs whose workers died on every attempt """
+	await s.exec(update(LlmJobs)
+			.where(_expired_lease(), LlmJobs.attempts >= LLM_JOB_MAX_ATTEMPTS)
+			.values(status=LlmJobStatus.FAILED, error='Lease expired', iam_token=None, finished_at=_now()))
+
+async def renew(job: LlmJobs) -> None:
+	""" Heartbeat: keeps the lease of a running job from expiring while its worker is alive """
+	while True:
+		await asyncio.sleep(LLM_JOB_LEASE / 3)
+		try:
+			async with get_session() as s:
+				await s.exec(update(LlmJobs).where(_owned(job)).values(locked_until=_lease()))
+				await s.commit()
+		except asyncio.CancelledError:
+			raise
+		except Exception:
+			metrics.inc('llm.jobs.renew_errors')
+			traceback.print_exc()
+
+async def finish(s: SessionDep, job: LlmJobs, result: Optional[dict] = None, error: Optional[str] = None) -> bool:
+	""" Stores the outcome unless the job was taken over meanwhile, in which case it belongs to the new owner """
+	finished = (await s.exec(update(LlmJobs)
+			.where(_owned(job))
+			.values(
+				status=LlmJobStatus.FAILED if error else LlmJobStatus.DONE,
+				result=result, error=error, iam_token=None,
+				locked_until=None, finished_at=_now())
+			.returning(LlmJobs.id))).first() is not None
+	if not finished:
+		metrics.inc('llm.jobs.lost')
+	return finished
+
+
+async def execute(client: httpx.AsyncClient, job: LlmJobs) -> None:
+	""" Runs the job's request like the route would, at batch priority.
+	Its user turn, answer and tasks are committed with the outcome, or dropped if the job was lost """
+	heartbeat = asyncio.create_task(renew(job))
+	try:
+		async with get_session() as s:
+			result = await llm_service.general_request(
+				s=s, client=client, url=job.url,
+				request=job.request,
+				headers=llm_service.build_headers(job.iam_token or ''),
+				action=job.action,
+				project_id=job.project_id,
+				context_depth=job.context_depth,
+				timeout=job.timeout,
+				priority=Priority.BATCH,
+				provider=get_provider(job.provider, job.action),
+				defer_turn=True
+			)
+			if not await finish(s, job, result=result):
+				await s.rollback()
+				return
+			await s.commit()
+		metrics.inc('llm.jobs.done')
+	except asyncio.CancelledError:
+		""" Left running, another worker takes it over once the lease expires """
+		raise
+	except Exception as e:
+		metrics.inc('llm.jobs.failed')
+		traceback.print_exc()
+		async with get_session() as s:
+			await finish(s, job, error=str(e) or type(e).__name__)
+			await s.commit()
+	finally:
+		heartbeat.cancel()
+
+
+async def run_worker(client: httpx.AsyncClient) -> None:
+	""" Background job: claims and runs LLM jobs until cancelled """
+	while True:
+		try:
+			_submitted.clear()
+			async with get_session() as s:
+				job = await claim(s)
+				if job is None:
+					await give_up_abandoned(s)
+				await s.commit()
+			if job is not None:
+				await execute(client, job)
+				continue
+		except asyncio.CancelledError:
+			raise
+		except Exception:
+			metrics.inc('llm.jobs.worker_errors')
+			traceback.print_exc()
+		""" Idle: wait for a submission, polling in case a notification was missed """
+		try:
+			await asyncio.wait_for(_submitted.wait(), LLM_JOB_POLL_INTERVAL)
+		except asyncio.TimeoutError:
+			pass
+
+async def run_listener() -> None:
+	""" Background job: wakes the idle workers of this process when a job is submitted anywhere """
+	while True:
+		try:
+			async for _ in listen(JOBS_CHANNEL):
+				_submitted.set()
+		except asyncio.CancelledError:
+			raise
+		except Exception:
+			metrics.inc('llm.jobs.listener_errors')
+			traceback.print_exc()
+		await asyncio.sleep(LLM_JOB_POLL_INTERVAL)
@@ -0,0 +1,97 @@
+""" json imports """
+import json
+import re
+""" typing imports """
+from typing import List, Optional
+
+
+_STRUCTURAL = re.compile(r'["{}\[\]]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+class ArrayItemStream:
+	""" Incremental scanner for the object items of one array in a JSON answer, e.g. {"tasks": [{...}, ...]}.
+	Text may arrive in pieces and be wrapped in prose or code fences: scanning starts at the first '{'
+	and stops when that object closes, so trailing braces are ignored. Text is scanned once,
+	and every item is decoded as soon as its closing brace arrives """
+
+	def __init__(self, key: str) -> None:
+		self.key = key
+		self.done = False
+		self._text = ''
+		self._pos = 0
+		self._stack: List[str] = []
+		self._in_string = False
+		self._escape = False
+		self._string_start = 0
+		self._last_key: Optional[str] = None
+		self._in_array = False
+		self._item_start: Optional[int] = None
+
+	def feed(self, chunk: str) -> List[dict]:
+		""" Scans the next piece of text, returns the items completed by it """
+		items: List[dict] = []
+		if self.done:
+			return items
+		self._text += chunk
+		text = self._text
+
+		while not self.done:
+			if self._escape:
+				if self._pos >= len(text):
+					break
+				self._escape = False
+				self._pos += 1
+			""" Jumps straight to the next character that matters, plain text is skipped in C """
+			match = (_STRING_SPECIAL if self._in_string else _STRUCTURAL).search(text, self._pos)
+			if match is None:
+				self._pos = len(text)
+				break
+			self._pos = match.start()
+			char = text[self._pos]
+			if self._in_string:
+				if char == '\\':
+					self._escape = True
+				else:
+					self._in_string = False
+					if self._stack == ['{']:
+						self._last_key = self._decode(text[self._string_start:self._pos + 1])
+			elif char == '"':
+				if self._stack:
+					self._in_string = True
+					self._string_start = self._pos
+			elif char in '{[':
+				if char == '[' and self._stack == ['{']:
+					self._in_array = self._last_key == self.key
+				if char == '{' and self._in_array and self._stack == ['{', '[']:
+					self._item_start = self._pos
+				self._stack.append(char)
+			elif self._stack:
+				self._stack.pop()
+				if char == '}' and self._item_start is not None and self._stack == ['{', '[']:
+					item = self._decode(text[self._item_start:self._pos + 1])
+					if isinstance(item, dict):
+						items.append(item)
+					self._item_start = None
+				if char == ']' and self._stack == ['{']:
+					self._in_array = False
+				if not self._stack:
+					self.done = True
+			self._pos += 1
+
+		self._compact()
+		return items
+
+	def _compact(self) -> None:
+		""" Drops text no pending item or key can refer to any more """
+		if self._item_start is not None or self._in_string:
+			return
+		self._text = self._text[self._pos:]
+		self._pos = 0
+
+	@staticmethod
+	def _decode(text: str):
+		try:
+			return json.loads(text)
+		except json.JSONDecodeError:
+			return None
@@ -0,0 +1,216 @@
+""" httpx import """
+import httpx
+""" json imports """
+import json
+""" asyncio imports """
+import asyncio
+""" typing imports """
+from typing import Dict, Optional, Tuple
+""" Internal imports """
+from core.config import (
+	LLM_DEFAULT_PROVIDER, LLM_ACTION_PROVIDERS, LLM_STUB_LATENCY,
+	OLLAMA_URL, OLLAMA_MODEL, OPENAI_URL, OPENAI_MODEL
+)
+from models.db_models import PromptTitle
+
+
+def completion_body(text: str, final: bool = True) -> Dict:
+	""" A completion in the YandexGPT shape the API answers with, whatever the backend """
+	return { 'result': { 'alternatives': [ {
+		'message': { 'role': 'assistant', 'text': text },
+		'status': 'ALTERNATIVE_STATUS_FINAL' if final else 'ALTERNATIVE_STATUS_PARTIAL'
+	} ] } }
+
+
+class Provider:
+	""" Translates the YandexGPT-shaped request built by llm_service to one backend and back.
+	Pooling, queueing, retries and streaming stay in llm_service and work the same for all """
+	name = 'yandex'
+	""" Streamed chunks carry the whole text so far, not only the new part """
+	cumulative = True
+
+	def __init__(self, url: Optional[str] = None, model: Optional[str] = None) -> None:
+		""" url and model replace the ones of the request, for backends the server is set up for """
+		self.url = url
+		self.model = model
+
+	def client(self, shared: httpx.AsyncClient) -> httpx.AsyncClient:
+		return shared
+
+	async def aclose(self) -> None:
+		""" Closes clients of the provider's own, the shared one belongs to the application """
+
+	def build(
+		self, client: httpx.AsyncClient,
+		url: str, request: Dict, headers: Dict[str, str],
+		timeout: float) -> httpx.Request:
+		url, body, headers = self.translate(self.url or url, request, headers)
+		return client.build_request('POST', url=url, headers=headers, json=body, timeout=timeout)
+
+	def translate(self, url: str, request: Dict, headers: Dict[str, str]) -> Tuple[str, Dict, Dict[str, str]]:
+		if self.model:
+			request = { **request, 'modelUri': self.model }
+		return url, request, headers
+
+	def text(self, body: Dict) -> Optional[str]:
+		""" Message text of a complete response """
+		try:
+			return body["result"]["alternatives"][0]["message"]["text"]
+		except (KeyError, IndexError, TypeError):
+			return None
+
+	def completion(self, body: Dict) -> Dict:
+		return body
+
+	def chunk(self, line: str) -> Optional[str]:
+		""" Text carried by one line of a streamed response """
+		try:
+			return self.text(json.loads(line))
+		except json.JSONDecodeError:
+			return None
+
+	def event(self, line: str, text: str) -> str:
+		""" Data of the server-sent event relaying a line, text is the whole message so far """
+		return line
+
+
+class YandexProvider(Provider):
+	pass
+
+
+class OllamaProvider(Provider):
+	""" Local models served by Ollama's /api/chat """
+	name = 'ollama'
+	cumulative = False
+
+	def translate(self, url: str, request: Dict, headers: Dict[str, str]) -> Tuple[str, Dict, Dict[str, str]]:
+		options = request.get('completionOptions', {})
+		body = {
+			'model': self.model or request.get('modelUri'),
+			'messages': _chat_messages(request),
+			'stream': bool(options.get('stream')),
+			'options': { 'temperature': options.get('temperature'), 'num_predict': options.get('max_tokens') },
+		}
+		if request.get('jsonObject') or request.get('jsonSchema'):
+			body['format'] = 'json'
+		return url.rstrip('/') + '/api/chat', body, { 'Content-Type': 'application/json' }
+
+	def text(self, body: Dict) -> Optional[str]:
+		try:
+			return body['message']['content']
+		except (KeyError, TypeError):
+			return None
+
+	def completion(self, body: Dict) -> Dict:
+		return completion_body(self.text(body) or '')
+
+	def event(self, line: str, text: str) -> str:
+		return json.dumps(completion_body(text, final=False))
+
+
+class OpenAIProvider(Provider):
+	""" Any server speaking the OpenAI chat completions API (vLLM, llama.cpp, LM Studio, OpenAI) """
+	name = 'openai'
+	cumulative = False
+
+	def translate(self, url: str, request: Dict, headers: Dict[str, str]) -> Tuple[str, Dict, Dict[str, str]]:
+		options = request.get('completionOptions', {})
+		body = {
+			'model': self.model or request.get('modelUri'),
+			'messages': _chat_messages(request),
+			'stream': bool(options.get('stream')),
+			'temperature': options.get('temperature'),
+			'max_tokens': options.get('max_tokens'),
+		}
+		if request.get('jsonObject') or request.get('jsonSchema'):
+			body['response_format'] = { 'type': 'json_object' }
+		return url, body, headers
+
+	def text(self, body: Dict) -> Optional[str]:
+		try:
+			choice = body['choices'][0]
+			return (choice.get('message') or choice.get('delta') or {}).get('content')
+		except (KeyError, IndexError, TypeError, AttributeError):
+			return None
+
+	def completion(self, body: Dict) -> Dict:
+		return completion_body(self.text(body) or '')
+
+	def chunk(self, line: str) -> Optional[str]:
+		""" Server-sent events: 'data: {...}', closed by 'data: [DONE]' """
+		if not line.startswith('data:'):
+			return None
+		data = line[len('data:'):].strip()
+		if data == '[DONE]':
+			return None
+		return super().chunk(data)
+
+	def event(self, line: str, text: str) -> str:
+		return json.dumps(completion_body(text, final=False))
+
+
+class StubProvider(Provider):
+	""" Answers locally after a fixed latency, for tests and benchmarks.
+	Goes through its own in-memory transport, so queueing, retries and streaming still run """
+	name = 'stub'
+
+	def __init__(self, latency: float = 0.0, text: str = 'Stub answer') -> None:
+		super().__init__()
+		self.latency = latency
+		self.answer = text
+		self._client: Optional[httpx.AsyncClient] = None
+
+	def client(self, shared: httpx.AsyncClient) -> httpx.AsyncClient:
+		""" Created on first use, inside the running application """
+		if self._client is None:
+			self._client = httpx.AsyncClient(transport=httpx.MockTransport(self._respond))
+		return self._client
+
+	async def aclose(self) -> None:
+		client, self._client = self._client, None
+		if client is not None:
+			await client.aclose()
+
+	def build(self, client, url, request, headers, timeout) -> httpx.Request:
+		return client.build_request('POST', url='http://stub/', json=request, timeout=timeout)
+
+	def _text_for(self, request: Dict) -> str:
+		if request.get('jsonObject'):
+			return json.dumps({ 'tasks': [ { '1': self.answer } ] })
+		return self.answer
+
+	async def _respond(self, upstream: httpx.Request) -> httpx.Response:
+		await asyncio.sleep(self.latency)
+		request = json.loads(upstream.content)
+		text = self._text_for(request)
+		if not request.get('completionOptions', {}).get('stream'):
+			return httpx.Response(200, json=completion_body(text))
+		""" Cumulative chunks, word by word, like YandexGPT """
+		words = text.split(' ')
+		lines = [ json.dumps(completion_body(' '.join(words[:i]), final=i == len(words))) for i in range(1, len(words) + 1) ]
+		return httpx.Response(200, content='\n'.join(lines).encode())
+
+
+def _chat_messages(request: Dict) -> list:
+	""" YandexGPT {role, text} messages as chat {role, content} ones """
+	return [ { 'role': message['role'], 'content': message['text'] } for message in request.get('messages', []) ]
+
+
+PROVIDERS: Dict[str, Provider] = {
+	'yandex': YandexProvider(),
+	'ollama': OllamaProvider(OLLAMA_URL, OLLAMA_MODEL),
+	'openai': OpenAIProvider(OPENAI_URL, OPENAI_MODEL),
+	'stub': StubProvider(LLM_STUB_LATENCY),
+}
+
+
+def get_provider(name: Optional[str] = None, action: Optional[PromptTitle] = None) -> Provider:
+	""" The provider asked for, else the one the action is routed to, else the default.
+	Raises KeyError for an unknown name """
+	if name is None and action is not None:
+		name = LLM_ACTION_PROVIDERS.get(action)
+	return PROVIDERS[name or LLM_DEFAULT_PROVIDER]
+
+async def close_providers() -> None:
+	for provider in PROVIDERS.values():
+		await provider.aclose()
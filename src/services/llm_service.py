@@ -5,33 +5,98 @@ from fastapi.responses import JSONResponse, StreamingResponse
 from sqlmodel import and_, desc, select
 """ httpx import """
 import httpx
+""" pydantic imports """
+from pydantic import ValidationError
 
+import asyncio
+import hashlib
 import json
-import re
+import random
+from contextlib import asynccontextmanager
 """ typing imports """
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Union
+""" time imports """
+from time import perf_counter
 """ Internal imports """
-from core.db import SessionDep
+from core.cache import SingleFlight, TTLCache
+from core.config import (
+	LLM_CACHE_SIZE, LLM_CACHE_TTL, LLM_CONCURRENCY, LLM_QUEUE_TIMEOUT,
+	LLM_MAX_RETRIES, LLM_RETRY_BACKOFF, LLM_RETRY_BACKOFF_MAX
+)
+from core.db import SessionDep, get_session
+from core.limiter import Priority, PriorityLimiter
+from core.metrics import metrics
 from services import general_service as gen
-from models.db_models import Context, ContextBase, MessageRole, PlanBase, PromptTitle, Prompts, ReminderBase, TaskBase, Tasks
+from services import prompt_service as prompts
+from services.json_stream import ArrayItemStream
+from services.llm_providers import Provider, get_provider
+from models.llm_models import BaseRequest, CompletionOptions, OptionsRequest, ProblemRequest, generated_task
+from models.db_models import Context, ContextBase, MessageRole, PlanBase, PromptTitle, ReminderBase, TaskBase, Tasks
   
 
+""" Upstream completion bodies by request content """
+_completions = TTLCache(LLM_CACHE_SIZE, LLM_CACHE_TTL)
+_in_flight = SingleFlight()
 
-async def general_request(
-	s: SessionDep,
-	url: str, request: Dict, headers: Dict[str, str],
+""" Upstream concurrency """
+RETRY_STATUSES = { 429, 500, 502, 503, 504 }
+MAX_LIMITERS = 1024
+_limiters: Dict[tuple, PriorityLimiter] = {}
+metrics.gauge('llm.queue.depth', lambda: sum(l.waiting for l in _limiters.values()))
+metrics.gauge('llm.queue.active', lambda: sum(l.active for l in _limiters.values()))
+
+
+def build_request(json: BaseRequest, action: PromptTitle) -> Dict:
+	""" Upstream request body without messages, they are added from context when it is sent """
+	request = {
+		'modelUri': json.model_uri,
+		'completionOptions': CompletionOptions().model_dump()
+	}
+
+	if isinstance(json, OptionsRequest):
+		request['completionOptions'] = json.options.model_dump()
+		request['jsonSchema'] = { "schema": {
+			"tasks": [
+				{"1": "description"},
+				{"2": "description"},
+				{"3": "description"},
+				{"4": "description"},
+				{"5": "description"},
+			]}
+		}
+
+	if action in [PromptTitle.TASK, PromptTitle.DIV_TASK, PromptTitle.RE_TASK]:
+		request['jsonObject'] = True
+
+	if isinstance(json, ProblemRequest):
+		request.update({
+			'problem': json.problem
+		})
+	return request
+
+def build_headers(iam_token: str) -> Dict[str, str]:
+	return {
+		'Authorization': 'Bearer ' + iam_token,
+		'Content-Type' : 'application/json'
+	}
+
+
+async def _prepare_request(
+	s: SessionDep, request: Dict,
 	action: PromptTitle, project_id: int,
 	context_depth: int,
-	timeout: int) -> JSONResponse:
+	defer_turn: bool = False) -> Optional[ContextBase]:
+	""" Fills request messages from prompts and context, and stores the user turn.
+	With defer_turn the turn is returned instead, for the caller to store with the answer """
 
 	text: str
-	description: str
+	description: str = ''
 	messages = { 'messages' : [] }
-	query = select(Prompts)
+	turn: Optional[ContextBase] = None
 
-	""" Get prompts """
-	sys_prompt_query = s.exec(query.where(Prompts.title == 'system')).first()
-	prompt_query = s.exec(query.where(Prompts.title == action)).first()
+	""" Get prompts from the process-local cache """
+	sys_prompt = prompts.get_prompt(PromptTitle.SYSTEM)
+	prompt = prompts.get_prompt(action)
 
 	""" Get project """
 	project = await gen.get_project_by_id(s, id=project_id)
@@ -41,101 +106,331 @@ async def general_request(
 	""" Get context if present """
 	context = await gen.get_context_by_project_id(s, project_id, action, context_depth)
 
-	if sys_prompt_query:
-		system_prompt = { 'role': 'system', 'text': sys_prompt_query.prompt }
+	if sys_prompt:
+		system_prompt = { 'role': 'system', 'text': sys_prompt }
 		messages['messages'].append(system_prompt)
 
-	if prompt_query:
-		text = prompt_query.prompt + '\n\n' + description
+	if prompt:
+		text = prompt + '\n\n' + description
 		if 'problem' in request.keys():
 			text += "\nProblem description: " + request['problem']
 		messages['messages'].append({ 'role': 'user', 'text': text })
 
-		await gen.create_context(s, ContextBase(
-				project_id=project_id, role=MessageRole.USER,
-				action=action, message=text)
-		)
+		turn = ContextBase(project_id=project_id, role=MessageRole.USER, action=action, message=text)
+		if not defer_turn:
+			await gen.create_context(s, turn)
+			turn = None
 
 	context.extend(messages['messages'])
 	request['messages'] = context
-	""" Sending post request to external api """
-	async with httpx.AsyncClient(timeout=timeout) as client:
-		response = await client.post(url=url, headers=headers, json=request)
-		""" Checking response status """
-		response.raise_for_status()
+	""" Commit user turn, so no pooled connection is held during the upstream call """
+	await s.commit()
+	return turn
+
+
+async def _save_answer(
+	s: SessionDep, project_id: int,
+	action: PromptTitle, message: str,
+	items: Optional[List[dict]] = None) -> None:
+	""" Adding assistant context to db """
+	if message:
+		await gen.create_context(s, ContextBase(
+			project_id=project_id, role=MessageRole.ASSISTANT,
+			action=action, message=message)
+		)
+		await _match_action_and_create(s, project_id, action, message, items)
+
+
+async def general_request(
+	s: SessionDep, client: httpx.AsyncClient,
+	url: str, request: Dict, headers: Dict[str, str],
+	action: PromptTitle, project_id: int,
+	context_depth: int,
+	timeout: int,
+	priority: Priority = Priority.INTERACTIVE,
+	provider: Optional[Provider] = None,
+	defer_turn: bool = False) -> JSONResponse:
+	""" With defer_turn the user turn is only stored with the answer, nothing is committed here after the call """
+
+	provider = provider or get_provider(action=action)
+	turn = await _prepare_request(s, request, action, project_id, context_depth, defer_turn)
+	body = await _cached_completion(client, provider, url, request, headers, timeout, priority)
+	message = provider.text(body) or 'Error was interrupt'
+	if turn is not None:
+		await gen.create_context(s, turn)
+	await _save_answer(s, project_id, action, message)
+	return body
+
+
+def _request_key(provider: Provider, url: str, request: Dict, headers: Dict[str, str]) -> str:
+	""" Content address of an upstream request. The credentials are part of it,
+	so an answer is never served to a caller upstream would have refused """
+	content = json.dumps([provider.name, url, headers.get('Authorization'), request], sort_keys=True, default=str)
+	return hashlib.sha256(content.encode()).hexdigest()
+
+
+async def complete(
+	client: httpx.AsyncClient, provider: Provider,
+	url: str, request: Dict, headers: Dict[str, str],
+	timeout: int,
+	priority: Priority = Priority.INTERACTIVE) -> Dict:
+	""" One upstream completion, queued and retried, in the YandexGPT response shape """
+	client = provider.client(client)
+	start = perf_counter()
+	async with _upstream_slot(request, headers, priority):
+		response = await _send_with_retries(
+			lambda: client.send(provider.build(client, url, request, headers, timeout)))
+	metrics.observe(f'llm.provider.{provider.name}.seconds', perf_counter() - start)
+	return provider.completion(response.json())
+
+
+async def _cached_completion(
+	client: httpx.AsyncClient, provider: Provider,
+	url: str, request: Dict, headers: Dict[str, str],
+	timeout: int,
+	priority: Priority = Priority.INTERACTIVE) -> Dict:
+	""" Upstream completion body, from the cache or shared with an identical call in flight """
+	key = _request_key(provider, url, request, headers)
+	body = _completions.get(key)
+	if body is not None:
+		metrics.inc('llm.cache.hits')
+		return body
+	metrics.inc('llm.cache.misses')
+
+	async def _post() -> Dict:
+		""" Failures are not cached """
+		body = await complete(client, provider, url, request, headers, timeout, priority)
+		_completions.set(key, body)
+		return body
+
+	body, shared = await _in_flight.do(key, _post)
+	if shared:
+		metrics.inc('llm.cache.shared')
+	return body
+
+
+def _limiter(request: Dict, headers: Dict[str, str]) -> PriorityLimiter:
+	""" One limiter per model URI and token, idle ones are dropped as tokens rotate """
+	key = (request.get('modelUri'), headers.get('Authorization'))
+	limiter = _limiters.get(key)
+	if limiter is None:
+		if len(_limiters) >= MAX_LIMITERS:
+			for idle in [ k for k, l in _limiters.items() if l.idle ]:
+				del _limiters[idle]
+		limiter = _limiters[key] = PriorityLimiter(LLM_CONCURRENCY)
+	return limiter
+
+async def _acquire_upstream(request: Dict, headers: Dict[str, str], priority: Priority) -> Callable[[], None]:
+	""" Waits in the queue for a free upstream slot, returns its release """
+	limiter = _limiter(request, headers)
+	start = perf_counter()
+	await limiter.acquire(priority, LLM_QUEUE_TIMEOUT)
+	metrics.observe('llm.queue.wait_seconds', perf_counter() - start)
+	return limiter.release
+
+@asynccontextmanager
+async def _upstream_slot(request: Dict, headers: Dict[str, str], priority: Priority) -> AsyncIterator[None]:
+	release = await _acquire_upstream(request, headers, priority)
+	try:
+		yield
+	finally:
+		release()
+
+def _retry_delay(response: Optional[httpx.Response], attempt: int) -> float:
+	""" Retry-After when upstream sends one, exponential backoff with full jitter otherwise """
+	if response is not None:
+		try:
+			return min(float(response.headers['Retry-After']), LLM_RETRY_BACKOFF_MAX)
+		except (KeyError, ValueError):
+			pass
+	return random.uniform(0, min(LLM_RETRY_BACKOFF * 2 ** attempt, LLM_RETRY_BACKOFF_MAX))
+
+async def _send_with_retries(send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+	""" Sends again on 429, 5xx and transport errors. Raises HTTPStatusError for any other failure """
+	for attempt in range(LLM_MAX_RETRIES + 1):
+		last = attempt == LLM_MAX_RETRIES
+		response = None
+		try:
+			response = await send()
+		except httpx.TransportError:
+			metrics.inc('llm.upstream.transport_errors')
+			if last:
+				raise
+		else:
+			if response.status_code not in RETRY_STATUSES or last:
+				if response.is_error:
+					metrics.inc('llm.upstream.errors')
+					await response.aread()
+					await response.aclose()
+					response.raise_for_status()
+				return response
+			await response.aclose()
+		metrics.inc('llm.upstream.retries')
+		await asyncio.sleep(_retry_delay(response, attempt))
+
+
+class CompletionStream:
+	""" Relays an upstream streamed completion chunk by chunk as server-sent events.
+	The whole text is kept as it grows, and stored by save() once the stream is over.
+	The upstream slot is held until the stream is closed """
+
+	def __init__(
+			self, response: httpx.Response, provider: Provider, action: PromptTitle, project_id: int,
+			release: Optional[Callable[[], None]] = None
+		) -> None:
+		self.response = response
+		self._release = release
+		self.provider = provider
+		self.action = action
+		self.project_id = project_id
+		self.message: Optional[str] = None
+		""" Set once upstream has sent the whole answer, a client leaving midway leaves it unset """
+		self.completed = False
+		""" Task items are parsed as the answer grows, not all at once at the end """
+		self.tasks: Optional[ArrayItemStream] = None
+		self.items: List[dict] = []
+		if action in [PromptTitle.TASK, PromptTitle.RE_TASK]:
+			self.tasks = ArrayItemStream('tasks')
+
+	async def events(self) -> AsyncIterator[str]:
+		start = perf_counter()
+		first = True
+		try:
+			async for line in self.response.aiter_lines():
+				if not line.strip():
+					continue
+				if first:
+					metrics.observe('llm.stream.first_chunk_seconds', perf_counter() - start)
+					first = False
+				text = self.provider.chunk(line)
+				if text is None:
+					continue
+				if not self.provider.cumulative:
+					text = (self.message or '') + text
+				self._grow(text)
+				yield f"data: {self.provider.event(line, text)}\n\n"
+			self.completed = True
+		finally:
+			await self.close()
+
+	async def close(self) -> None:
+		""" Closes the upstream response and frees its slot, once """
+		release, self._release = self._release, None
 		try:
-			message = response.json()["result"]["alternatives"][0]["message"]["text"]
-		except Exception as e:
-			message = 'Error was interrupt'
-		""" Adding assistant context to db """
-		if message:
-			await gen.create_context(s, ContextBase(
-				project_id=project_id, role=MessageRole.ASSISTANT,
-				action=action, message=message)
-			)
-			await _match_action_and_create(s, project_id, action, message)
-		return response.json()
+			await self.response.aclose()
+		finally:
+			if release is not None:
+				release()
+
+	def _grow(self, message: Optional[str]) -> None:
+		""" Feeds the parser only the text added since the previous chunk """
+		if not message:
+			return
+		previous = self.message or ''
+		self.message = message
+		if self.tasks is None:
+			return
+		if not message.startswith(previous):
+			self.tasks = ArrayItemStream('tasks')
+			self.items = []
+			previous = ''
+		self.items.extend(self.tasks.feed(message[len(previous):]))
+
+	async def save(self) -> None:
+		""" Runs after the response is sent, in its own session: the request one is closed by then.
+		Also closes the stream, in case the client left before it was read.
+		A cut-off answer is not stored, it would leave a partial plan or task set """
+		await self.close()
+		if not self.completed:
+			metrics.inc('llm.stream.abandoned')
+			return
+		if not self.message:
+			return
+		async with get_session() as s:
+			await _save_answer(s, self.project_id, self.action, self.message, self.items if self.tasks else None)
+			await s.commit()
+
+
+async def stream_request(
+	s: SessionDep, client: httpx.AsyncClient,
+	url: str, request: Dict, headers: Dict[str, str],
+	action: PromptTitle, project_id: int,
+	context_depth: int,
+	timeout: int,
+	priority: Priority = Priority.INTERACTIVE,
+	provider: Optional[Provider] = None) -> CompletionStream:
+
+	provider = provider or get_provider(action=action)
+	client = provider.client(client)
+	await _prepare_request(s, request, action, project_id, context_depth)
+	""" Upstream status is checked before the response starts, the body is read lazily.
+	The slot is handed to the stream, which frees it once the generation is over """
+	release = await _acquire_upstream(request, headers, priority)
+	try:
+		response = await _send_with_retries(
+			lambda: client.send(provider.build(client, url, request, headers, timeout), stream=True))
+	except BaseException:
+		release()
+		raise
+	return CompletionStream(response, provider, action, project_id, release)
 
 
 async def _match_action_and_create(
 	s: SessionDep,
 	project_id: int,
 	action: PromptTitle,
-	text: str) -> None:
+	text: str,
+	items: Optional[List[dict]] = None) -> None:
+	""" items are the task objects already parsed while the answer streamed in """
 
 	if action in [PromptTitle.PLAN, PromptTitle.RE_PLAN]:
 		plan = PlanBase(project_id=project_id, text=text)
 		await gen.create_plan(s, plan)
 
 	if action in [PromptTitle.TASK, PromptTitle.RE_TASK]:
-		print("\n\nresponse:\n")
-		print(repr(text))
-		built = _build_tasks(response=text)
-		parsed = _parse_tasks(built, project_id)
-		tasks = [
-			Tasks(**task.model_dump()) for task in parsed
-		]
-		print("\n\nTasks?\n")
-		print(tasks)
-		print("\n\n")
-		ids = await gen.create_tasks(s, tasks)
-		i = 0
-		for task in tasks:
-			id = ids[i]
-			await gen.create_remider(s, ReminderBase(
-				title=task.title, user_id=task.user_id,
-				project_id=task.project_id, task_id=id
-			))
-			i += 1
-  
+		if items is None:
+			items = ArrayItemStream('tasks').feed(text)
+		created = await _create_tasks(s, project_id, items)
+		if not created:
+			metrics.inc('llm.tasks.unparsed_answers')
+
 	if action in [PromptTitle.DIV_TASK]:
 		return
 
 
-def _build_tasks(response: str) -> Dict:
-	try:
-		print(repr(response))
-		match = re.search(r'\{[\s\S]*\}', response)
-		if not match:
-			return json.loads(response)
-		clean_json = match.group()
-		return json.loads(clean_json)
-	except json.JSONDecodeError:
-		print("Error: Invalid JSON format.")
-		return { "error": "Couldn't be parsed"}
-
-def _parse_tasks(tasks: Dict, project_id: int) -> List[TaskBase]:
-	parsed_tasks = []
-	print("\n\ntasks: ")
-	print(repr(tasks))
-	print("\n")
-
-	for task in tasks["tasks"]:
-		for task_name, task_desc in task.items():
-			_task = TaskBase(
-				title="task_"+task_name,
-				description=task_desc,
-				project_id=project_id
-			)
-			parsed_tasks.append(_task)
-	return parsed_tasks
+def _valid_tasks(items: Iterable[dict], project_id: int) -> Iterator[TaskBase]:
+	""" Tasks of the items matching GeneratedTask, the others are counted and skipped """
+	for item in items:
+		try:
+			task = generated_task.validate_python(item)
+		except ValidationError:
+			metrics.inc('llm.tasks.invalid')
+			continue
+		for name, description in task.items():
+			yield TaskBase(title="task_" + name, description=description, project_id=project_id)
+
+""" Tasks created per round trip while storing a TASK answer """
+TASK_BATCH_SIZE = 50
+
+async def _create_tasks(s: SessionDep, project_id: int, items: Iterable[dict]) -> int:
+	""" Creates tasks with their reminders, TASK_BATCH_SIZE per round trip """
+	created = 0
+	batch: List[TaskBase] = []
+	for task in _valid_tasks(items, project_id):
+		batch.append(task)
+		if len(batch) == TASK_BATCH_SIZE:
+			created += await _create_task_batch(s, batch)
+			batch = []
+	if batch:
+		created += await _create_task_batch(s, batch)
+	return created
+
+async def _create_task_batch(s: SessionDep, tasks: List[TaskBase]) -> int:
+	ids = await gen.create_tasks(s, tasks)
+	await gen.create_remiders(s, [
+		ReminderBase(
+			title=task.title, user_id=task.user_id,
+			project_id=task.project_id, task_id=id
+		) for task, id in zip(tasks, ids)
+	])
+	return len(ids)
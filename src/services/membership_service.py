@@ -0,0 +1,107 @@
+""" SQLModel imports """
+from sqlmodel import Session, select
+from sqlalchemy import event
+""" typing imports """
+from typing import Dict, List, Optional, Set
+""" uuid imports """
+from uuid import uuid4
+""" Internal imports """
+from core import events
+from core.db import SessionDep, get_session
+from core.metrics import metrics
+from models.db_models import TeamRoles, Teams
+
+
+""" Process-local copy of the Teams table for authorization checks: user -> {project: role},
+and the members of each project to forget a deleted project without a scan """
+_roles: Dict[int, Dict[int, TeamRoles]] = {}
+_members: Dict[int, Set[int]] = {}
+
+TEAM_JOINED = 'team.joined'
+TEAM_UPDATED = 'team.updated'
+TEAM_LEFT = 'team.left'
+PROJECT_DELETED = 'project.deleted'
+USER_DELETED = 'user.deleted'
+""" Events of this process are applied on commit, their notifications are skipped """
+ORIGIN = uuid4().hex
+
+metrics.gauge('membership.users', lambda: len(_roles))
+metrics.gauge('membership.projects', lambda: len(_members))
+
+
+def get_role(user_id: int, project_id: int) -> Optional[TeamRoles]:
+	return _roles.get(user_id, {}).get(project_id)
+
+def is_admin(user_id: int, project_id: int) -> bool:
+	return get_role(user_id, project_id) == TeamRoles.ADMIN
+
+
+def _set(user_id: int, project_id: int, role: TeamRoles) -> None:
+	_roles.setdefault(user_id, {})[project_id] = role
+	_members.setdefault(project_id, set()).add(user_id)
+
+def _discard(user_id: int, project_id: int) -> None:
+	projects = _roles.get(user_id)
+	if projects is not None:
+		projects.pop(project_id, None)
+		if not projects:
+			del _roles[user_id]
+	members = _members.get(project_id)
+	if members is not None:
+		members.discard(user_id)
+		if not members:
+			del _members[project_id]
+
+def apply(e: Dict) -> None:
+	type = e.get('type')
+	if type in (TEAM_JOINED, TEAM_UPDATED):
+		_set(e['user_id'], e['project_id'], TeamRoles(e['role']))
+	elif type == TEAM_LEFT:
+		_discard(e['user_id'], e['project_id'])
+	elif type == PROJECT_DELETED:
+		for user_id in list(_members.get(e['project_id'], ())):
+			_discard(user_id, e['project_id'])
+	elif type == USER_DELETED:
+		for project_id in list(_roles.get(e['user_id'], ())):
+			_discard(e['user_id'], project_id)
+
+
+async def load(s: SessionDep) -> None:
+	""" Replaces the map with the current table contents """
+	global _roles, _members
+	roles: Dict[int, Dict[int, TeamRoles]] = {}
+	members: Dict[int, Set[int]] = {}
+	for user_id, project_id, role in (await s.exec(select(Teams.user_id, Teams.project_id, Teams.role))).all():
+		if user_id is None:
+			continue
+		roles.setdefault(user_id, {})[project_id] = role
+		members.setdefault(project_id, set()).add(user_id)
+	_roles, _members = roles, members
+	metrics.inc('membership.reloads')
+
+async def _reload() -> None:
+	async with get_session() as s:
+		await load(s)
+
+
+async def publish(s: SessionDep, changes: List[Dict]) -> None:
+	""" Announces membership changes to every worker, this one included, once the transaction commits """
+	changes = [ { **change, 'origin': ORIGIN } for change in changes ]
+	s.info.setdefault('membership', []).extend(changes)
+	await events.publish(s, changes, internal=True)
+
+@event.listens_for(Session, 'after_commit')
+def _on_commit(session: Session) -> None:
+	for change in session.info.pop('membership', ()):
+		apply(change)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _on_rollback(session: Session, previous_transaction) -> None:
+	session.info.pop('membership', None)
+
+def _on_event(e: Dict) -> None:
+	if e.get('origin') not in (None, ORIGIN):
+		apply(e)
+
+events.bus.add_handler(_on_event)
+events.bus.add_resync(_reload)
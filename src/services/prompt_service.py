@@ -0,0 +1,63 @@
+""" SQLModel imports """
+from sqlmodel import func, select
+from sqlalchemy.dialects.postgresql import insert
+""" typing imports """
+from typing import Dict, Optional
+""" asyncio imports """
+import asyncio
+import traceback
+""" Internal imports """
+from core.db import SessionDep, get_session, listen
+from core.metrics import metrics
+from models.db_models import PromptTitle, Prompts
+
+
+""" Workers reload their prompts when a change is announced on this channel """
+PROMPTS_CHANNEL = 'thready_prompts'
+LISTEN_RETRY_DELAY = 5
+
+""" Process-local copy of the Prompts table, read on every LLM request """
+_prompts: Dict[PromptTitle, str] = {}
+
+
+def get_prompt(title: PromptTitle) -> Optional[str]:
+	return _prompts.get(title)
+
+def get_prompts() -> Dict[PromptTitle, str]:
+	return dict(_prompts)
+
+
+async def load(s: SessionDep) -> Dict[PromptTitle, str]:
+	""" Replaces the cached prompts with the current table contents """
+	global _prompts
+	prompts = (await s.exec(select(Prompts))).all()
+	_prompts = { PromptTitle(prompt.title): prompt.prompt for prompt in prompts }
+	metrics.inc('prompts.reloads')
+	return get_prompts()
+
+
+async def upsert_prompt(s: SessionDep, title: PromptTitle, prompt: str) -> None:
+	""" Stores a prompt and announces it to every worker once the transaction commits """
+	q = insert(Prompts).values(title=title, prompt=prompt)
+	q = q.on_conflict_do_update(index_elements=['title'], set_={ 'prompt': q.excluded.prompt })
+	await s.exec(q)
+	await s.exec(select(func.pg_notify(PROMPTS_CHANNEL, title)))
+
+
+async def run_listener() -> None:
+	""" Background job: reloads prompts on every change notification.
+	Reloads again after each reconnect, as notifications sent meanwhile are lost """
+	while True:
+		try:
+			async for _ in listen(PROMPTS_CHANNEL, on_listen=_reload):
+				await _reload()
+		except asyncio.CancelledError:
+			raise
+		except Exception:
+			metrics.inc('prompts.listener_errors')
+			traceback.print_exc()
+		await asyncio.sleep(LISTEN_RETRY_DELAY)
+
+async def _reload() -> None:
+	async with get_session() as s:
+		await load(s)
@@ -0,0 +1,194 @@
+""" SQLModel imports """
+from sqlalchemy import and_, case, func, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+""" httpx import """
+import httpx
+""" typing imports """
+from typing import List, Optional, Sequence, Tuple
+""" datetime imports """
+from datetime import datetime, timedelta, timezone
+""" heapq imports """
+from heapq import heappop, heappush
+""" time imports """
+from time import monotonic
+""" abc imports """
+from abc import ABC, abstractmethod
+""" asyncio imports """
+import asyncio
+import traceback
+""" Internal imports """
+from core import events
+from core.db import SessionDep, get_session
+from core.config import REMINDER_BATCH_SIZE, REMINDER_MAX_ATTEMPTS, REMINDER_SINKS, REMINDER_WEBHOOK_URL
+from core.metrics import metrics
+from models.db_models import ReminderDeliveries, ReminderDeliveryStatus, Reminders
+
+
+""" Reminders overdue by more than this when first seen are not sent any more """
+MAX_LATENESS = timedelta(days=1)
+deliveries = ReminderDeliveries.__table__
+
+
+#*
+#*	Sinks
+#*
+class ReminderSink(ABC):
+	""" Delivers one reminder, raising on failure """
+	name = 'sink'
+
+	@abstractmethod
+	async def send(self, reminder: Reminders) -> None: ...
+
+class LogSink(ReminderSink):
+	name = 'log'
+
+	async def send(self, reminder: Reminders) -> None:
+		print(f"Reminder for task {reminder.task_id} to user {reminder.user_id}: {reminder.title}")
+
+class WebhookSink(ReminderSink):
+	""" POSTs the reminder as JSON, any non-2xx answer is a failure """
+	name = 'webhook'
+
+	def __init__(self, client: httpx.AsyncClient, url: str) -> None:
+		self.client = client
+		self.url = url
+
+	async def send(self, reminder: Reminders) -> None:
+		response = await self.client.post(self.url, json=reminder.model_dump(mode='json'))
+		response.raise_for_status()
+
+def build_sinks(client: httpx.AsyncClient) -> List[ReminderSink]:
+	sinks: List[ReminderSink] = []
+	for name in REMINDER_SINKS:
+		if name == 'log':
+			sinks.append(LogSink())
+		elif name == 'webhook' and REMINDER_WEBHOOK_URL:
+			sinks.append(WebhookSink(client, REMINDER_WEBHOOK_URL))
+	return sinks
+
+
+#*
+#*	Due-queue
+#*
+def _utcnow() -> datetime:
+	""" send_time is naive UTC """
+	return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def send_time_for(deadline: datetime) -> datetime:
+	""" A day before the deadline, as naive UTC. Naive deadlines are UTC already, as for overdue tasks """
+	if deadline.tzinfo is not None:
+		deadline = deadline.astimezone(timezone.utc).replace(tzinfo=None)
+	return deadline - timedelta(days=1)
+
+def _claimable(d, send_time, now: datetime):
+	""" An existing delivery may be claimed for a new send_time, after its claim expired, or to retry a failure """
+	return or_(
+		d.send_time.is_distinct_from(send_time),
+		and_(d.status == ReminderDeliveryStatus.CLAIMED, d.claimed_until < now),
+		and_(d.status == ReminderDeliveryStatus.FAILED, d.attempts < REMINDER_MAX_ATTEMPTS))
+
+async def claim_due(s: SessionDep, horizon: float, limit: int = REMINDER_BATCH_SIZE) -> Sequence[Reminders]:
+	""" Claims reminders due within horizon seconds, that no live claim or delivery covers yet.
+	SKIP LOCKED lets several workers claim at once. A row unlocked by a claim committed after
+	this statement started is seen without it, so the upsert checks the delivery row again
+	and only the reminders it actually claimed are returned """
+	now = _utcnow()
+	lease = now + timedelta(seconds=2 * horizon + 60)
+	d = ReminderDeliveries
+	due = (select(Reminders)
+			.outerjoin(d, d.task_id == Reminders.task_id)
+			.where(Reminders.send_time.between(now - MAX_LATENESS, now + timedelta(seconds=horizon)))
+			.where(or_(d.task_id.is_(None), _claimable(d, Reminders.send_time, now)))
+			.order_by(Reminders.send_time)
+			.limit(limit)
+			.with_for_update(of=Reminders, skip_locked=True))
+	reminders = (await s.exec(due)).scalars().all()
+	if not reminders:
+		return reminders
+
+	q = insert(deliveries).values([
+		{ 'task_id': r.task_id, 'send_time': r.send_time, 'status': ReminderDeliveryStatus.CLAIMED, 'claimed_until': lease }
+		for r in reminders
+	])
+	q = q.on_conflict_do_update(
+		index_elements=['task_id'],
+		set_={
+			'send_time': q.excluded.send_time,
+			'status': q.excluded.status,
+			'claimed_until': q.excluded.claimed_until,
+			# a new send_time starts over, a retry keeps counting
+			'attempts': case(
+				(deliveries.c.send_time.is_distinct_from(q.excluded.send_time), 0),
+				else_=deliveries.c.attempts),
+		},
+		where=_claimable(deliveries.c, q.excluded.send_time, now))
+	claimed = set((await s.exec(q.returning(deliveries.c.task_id))).scalars().all())
+	if len(claimed) < len(reminders):
+		metrics.inc('reminders.claim_conflicts', len(reminders) - len(claimed))
+	return [ reminder for reminder in reminders if reminder.task_id in claimed ]
+
+async def finish(s: SessionDep, reminder: Reminders, error: Optional[str] = None) -> None:
+	await s.exec(update(ReminderDeliveries)
+			.where(ReminderDeliveries.task_id == reminder.task_id, ReminderDeliveries.send_time == reminder.send_time)
+			.values(
+				status=ReminderDeliveryStatus.FAILED if error else ReminderDeliveryStatus.SENT,
+				attempts=ReminderDeliveries.attempts + 1,
+				delivered_at=_utcnow(), claimed_until=None, error=error))
+
+
+async def _deliver_one(sinks: List[ReminderSink], reminder: Reminders) -> Optional[str]:
+	try:
+		for sink in sinks:
+			await sink.send(reminder)
+	except Exception as e:
+		metrics.inc('reminders.failed')
+		return f"{type(e).__name__}: {e}"
+	metrics.inc('reminders.sent')
+	metrics.observe('reminders.lateness_seconds', (_utcnow() - reminder.send_time).total_seconds())
+	return None
+
+async def deliver(sinks: List[ReminderSink], reminders: List[Reminders]) -> None:
+	errors = await asyncio.gather(*(_deliver_one(sinks, reminder) for reminder in reminders))
+	async with get_session() as s:
+		for reminder, error in zip(reminders, errors):
+			await finish(s, reminder, error)
+		""" Connected clients hear of sent reminders too, see core.events """
+		await events.publish(s, [
+			{ 'type': 'reminder.fired', 'project_id': reminder.project_id, 'task_id': reminder.task_id,
+				'user_id': reminder.user_id, 'send_time': reminder.send_time }
+			for reminder, error in zip(reminders, errors) if error is None
+		])
+		await s.commit()
+
+
+async def run_scheduler(sinks: List[ReminderSink], interval: float) -> None:
+	""" Background job: every interval claims the reminders due before the next claim,
+	keeps them in a heap by send_time and sleeps until the earliest one is due """
+	heap: List[Tuple[datetime, int, Reminders]] = []
+	next_claim = monotonic()
+	while True:
+		try:
+			if monotonic() >= next_claim:
+				async with get_session() as s:
+					for reminder in await claim_due(s, interval):
+						heappush(heap, (reminder.send_time, reminder.task_id, reminder))
+					await s.commit()
+				next_claim = monotonic() + interval
+
+			due = []
+			now = _utcnow()
+			while heap and heap[0][0] <= now:
+				due.append(heappop(heap)[2])
+			if due:
+				await deliver(sinks, due)
+		except asyncio.CancelledError:
+			raise
+		except Exception:
+			metrics.inc('reminders.scheduler_errors')
+			traceback.print_exc()
+			next_claim = monotonic() + interval
+
+		delay = next_claim - monotonic()
+		if heap:
+			delay = min(delay, (heap[0][0] - _utcnow()).total_seconds())
+		await asyncio.sleep(max(delay, 0))
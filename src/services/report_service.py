@@ -1,15 +1,17 @@
 """ SQLModel imports """
-from sqlalchemy import ColumnElement
+from sqlalchemy import ColumnElement, Row, func, literal
 from sqlmodel import Session, and_, select
 """ typing imports """
-from typing import List, Optional, Sequence, Type, TypeVar, Union, Dict
+from typing import Iterable, List, Optional, Sequence, Tuple, Type, TypeVar, Union, Dict
 """ datetime imports """
 from datetime import datetime, timezone
 """ Internal imports """
 from core import db
 from core.db import SessionDep
 from models.db_models import (
+	DeveloperStats,
 	ProjectBase,
+	ProjectStats,
 	ProjectUpdate,
 	TaskBase,
 	TaskUpdate,
@@ -22,7 +24,15 @@ from models.db_models import (
 
 """ Util """
 async def is_present_by_id(s: SessionDep, table: type, id: int) -> bool:
-	return s.exec(select(table).where(table.id == id)).first() is not None
+	return (await s.exec(select(table).where(table.id == id))).first() is not None
+
+def overdue_clause() -> ColumnElement[bool]:
+	""" Not done and past its deadline (deadlines are stored as naive UTC).
+	'DONE' is rendered inline so the planner can match ix_tasks_open_deadline """
+	return and_(
+		Tasks.status != literal(TaskStatus.DONE, Tasks.status.type, literal_execute=True),
+		Tasks.deadline.is_not(None),
+		Tasks.deadline < func.timezone('UTC', func.now()))
 
 """Get report on developer"""
 # async def get_all_tasks_by_user_id(s: SessionDep, user_id: int) -> Sequence[Tasks]:
@@ -31,53 +41,48 @@ async def is_present_by_id(s: SessionDep, table: type, id: int) -> bool:
 
 async def get_completed_tasks_by_user_id(s: SessionDep, user_id: int, project_id: int) -> Sequence[Tasks]:
 		query = select(Tasks).where(Tasks.user_id == user_id, Tasks.status == TaskStatus.DONE, Tasks.project_id == project_id)
-		return s.exec(query).all()
+		return (await s.exec(query)).all()
 
 async def get_tasks_in_progress_by_user_id(s: SessionDep, user_id: int, project_id: int) -> Sequence[Tasks]:
 		query = select(Tasks).where(Tasks.user_id == user_id, Tasks.status == TaskStatus.IN_PROGRESS, Tasks.project_id == project_id)
-		return s.exec(query).all()
+		return (await s.exec(query)).all()
 
 async def get_todo_tasks_by_user_id(s: SessionDep, user_id: int, project_id: int) -> Sequence[Tasks]:
 		query = select(Tasks).where(Tasks.user_id == user_id, Tasks.status == TaskStatus.TODO, Tasks.project_id == project_id)
-		return s.exec(query).all()
+		return (await s.exec(query)).all()
 
 async def get_overdue_tasks_by_user_id(s: SessionDep, user_id: int, project_id: int) -> Sequence[Tasks]:
-		q = select(Tasks)
-
-		q = (q.where(
-			and_(Tasks.user_id == user_id,
-				Tasks.status != TaskStatus.DONE,
-				Tasks.project_id == project_id,
-				Tasks.deadline is not None)))
-		tasks = s.exec(q).all()
-		_tasks = []
-		for task in tasks:
-			if task.deadline and task.deadline.replace(tzinfo=timezone.utc) < datetime.now(timezone.utc):
-				_tasks.append(task)
-		return s.exec(q).all()
+		query = select(Tasks).where(Tasks.user_id == user_id, Tasks.project_id == project_id, overdue_clause())
+		return (await s.exec(query)).all()
 
-async def get_all_tasks_by_user_id(s: Session, user_id: int, project_id: int) -> Sequence[Tasks]:
+async def get_all_tasks_by_user_id(s: SessionDep, user_id: int, project_id: int) -> Sequence[Tasks]:
     query = select(Tasks).where(Tasks.user_id == user_id, Tasks.project_id == project_id)
-    return s.exec(query).all()
+    return (await s.exec(query)).all()
 
-async def get_task_allotted_time(task: Tasks) -> float:
+def _task_allotted_time(task: Tasks) -> float:
 	time = -1
 	if task.deadline and task.created_at:
 		time = (task.deadline - task.created_at).total_seconds() / 3600
 	return time
 
-async def calculate_task_duration(task: Tasks) -> Dict:
+def _task_duration(task: Tasks, now: datetime) -> Dict:
 	if task.status == TaskStatus.DONE and task.changed_at and task.created_at:
 			duration = (task.changed_at - task.created_at).total_seconds() / 3600
 			return {"duration" : round(duration, 2), "is_done" : "true"}
 	else:
 			if task.created_at:
-				duration = (datetime.now() - task.created_at).total_seconds() / 3600 -2
+				duration = (now - task.created_at).total_seconds() / 3600 -2
 			return {"duration" : round(duration, 2), "is_done" : "false"}
 
+async def get_task_allotted_time(task: Tasks) -> float:
+	return _task_allotted_time(task)
+
+async def calculate_task_duration(task: Tasks) -> Dict:
+	return _task_duration(task, datetime.now())
+
 async def get_user_name_by_user_id(s: SessionDep, user_id: int) -> Optional[str]:
 	query = select(Users).where(Users.id == user_id)
-	user = s.exec(query).first()
+	user = (await s.exec(query)).first()
 	if user:
 		return user.name
 	return None
@@ -148,87 +153,138 @@ async def get_least_time_duration_task(tasks: Sequence[Tasks]) -> Optional[Dict]
 			"duration": 0.0
 		}
 
-async def get_developer_report(s: SessionDep, user_id: int, project_id: int) -> Dict:
-		tasks = await get_completed_tasks_by_user_id(s, user_id, project_id)
-		overdue_tasks = await get_overdue_tasks_by_user_id(s, user_id, project_id)
-		all_tasks = await get_all_tasks_by_user_id(s, user_id, project_id)
-		total_in_progress_tasks = await get_tasks_in_progress_by_user_id(s, user_id, project_id)
-		total_todo_tasks = await get_todo_tasks_by_user_id(s, user_id, project_id)
-		developer_name = await get_user_name_by_user_id(s, user_id)
-		total_time = 0.0
-
-		dificult = await get_most_time_duration_task(tasks)
-		easy = await get_least_time_duration_task(tasks)
-
-		all_users_tasks_duration = {}
+def _duration_task(picked: Optional[tuple]) -> Dict:
+	if picked is None:
+		return {"error": "Нет задач для анализа", "title": None, "duration": 0.0}
+	return {"title": picked[0], "duration": picked[1], "error": None}
+
+def summarize_developer_tasks(tasks: Iterable[Tasks]) -> Dict:
+	""" Every developer report counter, min/max duration and total hours in one pass """
+	now = datetime.now()
+	now_utc = datetime.now(timezone.utc)
+	all_tasks = completed = in_progress = todo = overdue = 0
+	total_time = 0.0
+	longest: Optional[tuple] = None
+	shortest: Optional[tuple] = None
+	all_users_tasks_duration = {}
 
-		tasks = await get_all_tasks_by_user_id(s, user_id, project_id)
+	for task in tasks:
+		all_tasks += 1
+		task_info = _task_duration(task, now)
+		duration = task_info['duration']
+		all_users_tasks_duration[task.title] = {
+				"duration": duration,
+				"is_done": task_info['is_done'],
+				"allotted_time" : _task_allotted_time(task)
+		}
+		total_time += duration
+
+		match task.status:
+			case TaskStatus.DONE:
+				completed += 1
+				if longest is None or duration > longest[1]:
+					longest = (task.title, duration)
+				if shortest is None or duration < shortest[1]:
+					shortest = (task.title, duration)
+			case TaskStatus.IN_PROGRESS:
+				in_progress += 1
+			case TaskStatus.TODO:
+				todo += 1
+
+		if task.status != TaskStatus.DONE and task.deadline:
+			deadline = task.deadline
+			if deadline.tzinfo is None:
+				deadline = deadline.replace(tzinfo=timezone.utc)
+			if deadline < now_utc:
+				overdue += 1
+
+	return {
+			"all_tasks" : all_tasks,
+			"total_completed_tasks": completed,
+			"total_in_progress_tasks": in_progress,
+			"total_todo_tasks" : todo,
+			"total_overdue_tasks" : overdue,
+			"all_users_tasks_duration": all_users_tasks_duration,
+			"most_dificult_task": _duration_task(longest),
+			"the_easiest_task" : _duration_task(shortest),
+			"total_hours_worked": round(total_time, 2),
+	}
 
-		for task in tasks:
-				task_info = await calculate_task_duration(task)
-				all_users_tasks_duration[task.title] = {
-						"duration": task_info['duration'],
-						"is_done": task_info['is_done'],
-						"allotted_time" : await get_task_allotted_time(task)
-				}
-				total_time += task_info['duration']
+async def get_developer_report(s: SessionDep, user_id: int, project_id: int) -> Dict:
+		developer_name = await get_user_name_by_user_id(s, user_id)
+		q = (select(Tasks.title, Tasks.status, Tasks.created_at, Tasks.changed_at, Tasks.deadline)
+				.where(Tasks.user_id == user_id, Tasks.project_id == project_id))
+		tasks = (await s.exec(q)).all()
 
 		return {
 				"developer_id": user_id,
 				"developer_name" : developer_name,
-				"all_tasks" : len(all_tasks),
-				"total_completed_tasks": len(tasks),
-				"total_in_progress_tasks": len(total_in_progress_tasks),
-				"total_todo_tasks" : len(total_todo_tasks),
-				"total_overdue_tasks" : len(overdue_tasks),
-				"all_users_tasks_duration": all_users_tasks_duration,
-				"most_dificult_task": dificult,
-				"the_easiest_task" : easy,
-				"total_hours_worked": round(total_time, 2),
+				**summarize_developer_tasks(tasks)
 		}
 
 """Get report on project"""
 async def get_project_title_by_project_id(s:SessionDep, project_id: int) -> str:
 		query = select(Projects).where(Projects.id == project_id)
-		project = s.exec(query).first()
+		project = (await s.exec(query)).first()
 		return project.title if project else ""
 
 async def get_developers_by_project_id(s: SessionDep, project_id: int) -> Sequence[Users]:
 		query = select(Users).join(Teams).where(Teams.project_id == project_id)
-		return s.exec(query).all()
+		return (await s.exec(query)).all()
 
 async def get_all_tasks_by_project_id(s: SessionDep, project_id: int) -> Sequence[Tasks]:
 		query = select(Tasks).where(Tasks.project_id == project_id)
-		return s.exec(query).all()
+		return (await s.exec(query)).all()
 
 async def get_compleated_tasks_by_project_id(s: SessionDep, project_id: int) -> Sequence[Tasks]:
 		query = select(Tasks).where(Tasks.project_id == project_id, Tasks.status == TaskStatus.DONE)
-		return s.exec(query).all()
+		return (await s.exec(query)).all()
 
 async def get_tasks_in_progress_by_project_id(s: SessionDep, project_id: int) -> Sequence[Tasks]:
 		query = select(Tasks).where(Tasks.project_id == project_id, Tasks.status == TaskStatus.IN_PROGRESS)
-		return s.exec(query).all()
+		return (await s.exec(query)).all()
 
 async def get_todo_tasks_by_project_id(s: SessionDep, project_id: int) -> Sequence[Tasks]:
 		query = select(Tasks).where(Tasks.project_id == project_id, Tasks.status == TaskStatus.TODO)
-		return s.exec(query).all()
+		return (await s.exec(query)).all()
 
 async def get_overdue_tasks_by_project_id(s: SessionDep, project_id: int) -> Sequence[Tasks]:
-	query = (select(Tasks)
-						.where(and_(Tasks.project_id == project_id, Tasks.status != TaskStatus.DONE,
-									Tasks.deadline is not None)))
-	tasks = s.exec(query).all()
-	_tasks = []
-	for task in tasks:
-		if task.deadline:
-			deadline = task.deadline
-			if deadline.tzinfo is None:
-				deadline = deadline.replace(tzinfo=timezone.utc)
-			if deadline < datetime.now(timezone.utc):
-				_tasks.append(task)
-	return _tasks
-
-async def get_most_productive_developer(s: SessionDep, users: Sequence[Users], project_id: int) -> Optional[Dict]:
+		query = select(Tasks).where(Tasks.project_id == project_id, overdue_clause())
+		return (await s.exec(query)).all()
+
+async def get_task_counts_by_developer(s: SessionDep, project_id: int) -> Dict[Optional[int], Row]:
+	""" Status and overdue counts of a project per assignee, in one GROUP BY """
+	q = (select(
+			Tasks.user_id,
+			func.count().label('total'),
+			func.count().filter(Tasks.status == TaskStatus.DONE).label('done'),
+			func.count().filter(Tasks.status == TaskStatus.IN_PROGRESS).label('in_progress'),
+			func.count().filter(Tasks.status == TaskStatus.TODO).label('todo'),
+			func.count().filter(overdue_clause()).label('overdue'))
+		.where(Tasks.project_id == project_id)
+		.group_by(Tasks.user_id))
+	return { row.user_id: row for row in (await s.exec(q)).all() }
+
+async def get_project_counts(s: SessionDep, project_id: int) -> Tuple[ProjectStats, Dict[Optional[int], Row]]:
+	""" Project totals and per-developer counts: stored statistics when the project is tracked,
+	a live GROUP BY otherwise """
+	totals = (await s.exec(select(ProjectStats).where(ProjectStats.project_id == project_id))).first()
+	if totals:
+		developers = (await s.exec(select(DeveloperStats).where(DeveloperStats.project_id == project_id))).all()
+		return totals, { developer.user_id: developer for developer in developers }
+
+	counts = await get_task_counts_by_developer(s, project_id)
+	totals = ProjectStats(project_id=project_id, **{
+		name: sum(getattr(row, name) for row in counts.values())
+		for name in ('total', 'todo', 'in_progress', 'done', 'overdue')
+	})
+	return totals, counts
+
+def _count(counts: Dict[Optional[int], Row], user_id: int, field: str) -> int:
+	row = counts.get(user_id)
+	return getattr(row, field) if row else 0
+
+async def get_most_productive_developer(users: Sequence[Users], counts: Dict[Optional[int], Row]) -> Optional[Dict]:
 	max_task_quantity = 0
 	developer = None
 
@@ -236,7 +292,7 @@ async def get_most_productive_developer(s: SessionDep, users: Sequence[Users], p
 		return {"name": "Нет разработчиков", "quantity": 0}
 	else:
 		for user in users:
-			quantity = len(await get_completed_tasks_by_user_id(s, user.id, project_id))
+			quantity = _count(counts, user.id, 'done')
 
 			if quantity > max_task_quantity:
 				max_task_quantity = quantity
@@ -246,7 +302,7 @@ async def get_most_productive_developer(s: SessionDep, users: Sequence[Users], p
 		return {"name" : developer.name, "quantity" : max_task_quantity}
 	else: return {"name": "None", "quantity": -1}
 
-async def get_most_flawed_developer(s: SessionDep, users: Sequence[Users], project_id: int) -> Optional[Dict]:
+async def get_most_flawed_developer(users: Sequence[Users], counts: Dict[Optional[int], Row]) -> Optional[Dict]:
 	max_task_quantity = 100000
 	developer = None
 
@@ -254,7 +310,7 @@ async def get_most_flawed_developer(s: SessionDep, users: Sequence[Users], proje
 		return {"name": "Нет разработчиков", "quantity": 0}
 	else:
 		for user in users:
-			quantity = len(await get_overdue_tasks_by_user_id(s, user.id, project_id))
+			quantity = _count(counts, user.id, 'overdue')
 
 			if quantity < max_task_quantity:
 				max_task_quantity = quantity
@@ -263,13 +319,13 @@ async def get_most_flawed_developer(s: SessionDep, users: Sequence[Users], proje
 		return {"name" : developer.name, "quantity" : max_task_quantity}
 	else: return {"name" : "None", "quantity" : -1}
 
-async def get_most_valuable_developer(s: SessionDep, users: Sequence[Users], project_id: int) -> Optional[Dict]:
+async def get_most_valuable_developer(users: Sequence[Users], counts: Dict[Optional[int], Row]) -> Optional[Dict]:
 	max_effectiveness = 0
 	developer = None
 
 	for user in users:
-		overdue_quantity = len(await get_overdue_tasks_by_user_id(s, user.id, project_id))
-		quantity = len(await get_all_tasks_by_user_id(s, user.id, project_id))
+		overdue_quantity = _count(counts, user.id, 'overdue')
+		quantity = _count(counts, user.id, 'total')
 
 		if quantity == 0:
 			continue
@@ -288,20 +344,17 @@ async def get_most_valuable_developer(s: SessionDep, users: Sequence[Users], pro
 
 async def get_project_report(s: SessionDep, project_id: int) -> Dict:
 		project_title = await get_project_title_by_project_id(s, project_id)
-		total_quantity_of_tasks = len(await get_all_tasks_by_project_id(s, project_id))
-		quantity_of_compleated_tasks = len(await get_compleated_tasks_by_project_id(s, project_id))
-		quantity_of_tasks_in_progress = len(await get_tasks_in_progress_by_project_id(s, project_id))
-		quantity_of_todo_tasks = len(await get_todo_tasks_by_project_id(s, project_id))
-		quantity_of_overdue_tasks = len(await get_overdue_tasks_by_project_id(s, project_id))
+		totals, counts = await get_project_counts(s, project_id)
 
 		users = await get_developers_by_project_id(s, project_id)
-		most_valuable_developer = await get_most_valuable_developer(s, users, project_id)
-		most_productive_developer = await get_most_productive_developer(s, users, project_id)
-		most_flawed_developer = await get_most_flawed_developer(s, users, project_id)
+		most_valuable_developer = await get_most_valuable_developer(users, counts)
+		most_productive_developer = await get_most_productive_developer(users, counts)
+		most_flawed_developer = await get_most_flawed_developer(users, counts)
 
 		all_tasks_in_project_with_duration = {}
-		tasks = await get_all_tasks_by_project_id(s, project_id)
-		for task in tasks:
+		q = (select(Tasks.title, Tasks.status, Tasks.created_at, Tasks.changed_at, Tasks.deadline)
+				.where(Tasks.project_id == project_id))
+		for task in (await s.exec(q)).all():
 			task_info = await calculate_task_duration(task)
 			all_tasks_in_project_with_duration[task.title] = {
 				"duration": task_info['duration'],
@@ -312,11 +365,11 @@ async def get_project_report(s: SessionDep, project_id: int) -> Dict:
 		return {
 			"project_id" : project_id,
 			"project_title" : project_title,
-			"total_quantity_of_tasks" : total_quantity_of_tasks,
-			"quantity_of_completed_tasks" : quantity_of_compleated_tasks,
-			"quantity_of_tasks_in_progress" : quantity_of_tasks_in_progress,
-			"quantity_of_todo_tasks" : quantity_of_todo_tasks,
-			"quantity_of_overdue_tasks" : quantity_of_overdue_tasks,
+			"total_quantity_of_tasks" : totals.total,
+			"quantity_of_completed_tasks" : totals.done,
+			"quantity_of_tasks_in_progress" : totals.in_progress,
+			"quantity_of_todo_tasks" : totals.todo,
+			"quantity_of_overdue_tasks" : totals.overdue,
 			"most_valuable_developer" : most_valuable_developer,
 			"most_productive_developer" : most_productive_developer,
 			"most_flawed_developer" : most_flawed_developer,
@@ -0,0 +1,139 @@
+""" SQLModel imports """
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+""" typing imports """
+from typing import Dict, Iterable, Tuple
+""" datetime imports """
+from datetime import datetime, timezone
+""" asyncio imports """
+import asyncio
+import traceback
+""" Internal imports """
+from core.db import SessionDep, get_session
+from core.metrics import metrics
+from services.report_service import overdue_clause
+from models.db_models import DeveloperStats, ProjectStats, Projects, Tasks, TaskStatus
+
+
+COUNTERS = ('total', 'todo', 'in_progress', 'done', 'overdue')
+project_stats = ProjectStats.__table__
+developer_stats = DeveloperStats.__table__
+""" Any constant shared by all workers, so only one of them reconciles at a time """
+RECONCILE_LOCK_ID = 0x7468726561647901
+
+
+""" Util """
+def _is_overdue(task: Tasks, now: datetime) -> bool:
+	if task.status == TaskStatus.DONE or not task.deadline:
+		return False
+	deadline = task.deadline
+	if deadline.tzinfo is None:
+		deadline = deadline.replace(tzinfo=timezone.utc)
+	return deadline < now
+
+def _task_deltas(task: Tasks, sign: int, now: datetime) -> Dict[str, int]:
+	deltas = dict.fromkeys(COUNTERS, 0)
+	deltas['total'] = sign
+	match task.status:
+		case TaskStatus.TODO: deltas['todo'] = sign
+		case TaskStatus.IN_PROGRESS: deltas['in_progress'] = sign
+		case TaskStatus.DONE: deltas['done'] = sign
+	if _is_overdue(task, now):
+		deltas['overdue'] = sign
+	return deltas
+
+def snapshot(task: Tasks) -> Tasks:
+	""" Copy of the fields statistics depend on, taken before an update """
+	return Tasks(project_id=task.project_id, user_id=task.user_id, status=task.status, deadline=task.deadline)
+
+
+#*
+#*	Incremental maintenance
+#*
+async def create_project_stats(s: SessionDep, project_id: int) -> None:
+	s.add(ProjectStats(project_id=project_id))
+	await s.flush()
+
+async def apply_tasks(s: SessionDep, tasks: Iterable[Tasks], sign: int = 1) -> None:
+	""" Adds (sign=1) or removes (sign=-1) the tasks' contribution in the current transaction.
+	Projects without a ProjectStats row are not tracked yet and are left to reconciliation """
+	now = datetime.now(timezone.utc)
+	projects: Dict[int, Dict[str, int]] = {}
+	developers: Dict[Tuple[int, int], Dict[str, int]] = {}
+
+	for task in tasks:
+		deltas = _task_deltas(task, sign, now)
+		project = projects.setdefault(task.project_id, dict.fromkeys(COUNTERS, 0))
+		for name, delta in deltas.items():
+			project[name] += delta
+		if task.user_id is not None:
+			developer = developers.setdefault((task.project_id, task.user_id), dict.fromkeys(COUNTERS, 0))
+			for name, delta in deltas.items():
+				developer[name] += delta
+
+	tracked = set()
+	for project_id, deltas in projects.items():
+		q = (update(project_stats)
+				.where(project_stats.c.project_id == project_id)
+				.values({ name: project_stats.c[name] + delta for name, delta in deltas.items() }))
+		if (await s.exec(q)).rowcount:
+			tracked.add(project_id)
+
+	for (project_id, user_id), deltas in developers.items():
+		if project_id not in tracked:
+			continue
+		q = insert(developer_stats).values(project_id=project_id, user_id=user_id, **deltas)
+		q = q.on_conflict_do_update(
+			index_elements=['project_id', 'user_id'],
+			set_={ name: developer_stats.c[name] + q.excluded[name] for name in COUNTERS })
+		await s.exec(q)
+
+
+#*
+#*	Reconciliation
+#*
+def _counters() -> tuple:
+	return (
+		func.count(Tasks.id).label('total'),
+		func.count(Tasks.id).filter(Tasks.status == TaskStatus.TODO).label('todo'),
+		func.count(Tasks.id).filter(Tasks.status == TaskStatus.IN_PROGRESS).label('in_progress'),
+		func.count(Tasks.id).filter(Tasks.status == TaskStatus.DONE).label('done'),
+		func.count(Tasks.id).filter(overdue_clause()).label('overdue'))
+
+async def reconcile(s: SessionDep) -> bool:
+	""" Recomputes every project's statistics from Tasks. Returns False if another worker holds the lock """
+	locked = (await s.exec(select(func.pg_try_advisory_xact_lock(RECONCILE_LOCK_ID)))).scalar()
+	if not locked:
+		return False
+
+	projects = (select(Projects.id, *_counters(), func.timezone('UTC', func.now()))
+			.select_from(Projects)
+			.outerjoin(Tasks, Tasks.project_id == Projects.id)
+			.group_by(Projects.id))
+	q = insert(project_stats).from_select(['project_id', *COUNTERS, 'reconciled_at'], projects)
+	q = q.on_conflict_do_update(
+		index_elements=['project_id'],
+		set_={ name: q.excluded[name] for name in (*COUNTERS, 'reconciled_at') })
+	await s.exec(q)
+
+	await s.exec(delete(developer_stats))
+	developers = (select(Tasks.project_id, Tasks.user_id, *_counters())
+			.where(Tasks.user_id.is_not(None))
+			.group_by(Tasks.project_id, Tasks.user_id))
+	await s.exec(insert(developer_stats).from_select(['project_id', 'user_id', *COUNTERS], developers))
+	return True
+
+async def run_reconciliation(interval: float) -> None:
+	""" Periodic job: corrects drift, and overdue counts that change with time alone """
+	while True:
+		try:
+			async with get_session() as s:
+				if await reconcile(s):
+					metrics.inc('stats.reconciliations')
+				await s.commit()
+		except asyncio.CancelledError:
+			raise
+		except Exception:
+			metrics.inc('stats.reconciliation_errors')
+			traceback.print_exc()
+		await asyncio.sleep(interval)
@@ -0,0 +1,5 @@
+""" Tests import the application modules the way src/main.py does """
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src'))
@@ -0,0 +1,51 @@
+""" One pooled connection per request: the routes share a single session and commit once """
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from core import config
+
+""" The engine is built on import from the POSTGRES_* settings (.env or environment) """
+if not all((config.SERVER, config.PORT, config.DB, config.USER, config.PASSWORD)):
+	pytest.skip("POSTGRES_* settings are not set", allow_module_level=True)
+
+import main
+from core.db import engine, init_database_and_tables
+
+
+@pytest.fixture(scope='module')
+def client():
+	try:
+		asyncio.run(init_database_and_tables())
+	except Exception as e:
+		pytest.skip(f"PostgreSQL is not reachable: {e}")
+	finally:
+		""" Connections belong to the loop that opened them, each TestClient call runs its own """
+		asyncio.run(engine.dispose())
+	return TestClient(main.server)
+
+
+@pytest.fixture
+def checkouts():
+	count = [0]
+	def on_checkout(*args):
+		count[0] += 1
+	event.listen(engine.sync_engine, 'checkout', on_checkout)
+	yield count
+	event.remove(engine.sync_engine, 'checkout', on_checkout)
+	asyncio.run(engine.dispose())
+
+
+def test_create_project_checks_out_one_connection(client, checkouts):
+	response = client.post('/api/db/users/', json={ 'name': 'checkouts' })
+	assert response.status_code == 200
+	owner_id = response.json()
+	asyncio.run(engine.dispose())
+	checkouts[0] = 0
+
+	""" Project, its statistics row and the owner's team membership in one unit of work """
+	response = client.post('/api/db/projects/', json={ 'title': 'checkouts', 'owner_id': owner_id })
+	assert response.status_code == 200
+	assert checkouts[0] == 1